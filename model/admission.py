@@ -0,0 +1,91 @@
+import math
+
+
+class AdmissionController(object):
+    """
+    Description:
+    -----------
+    Per-worker admission control for inference requests.
+
+    A request is rejected straight away when the worker already has `max_inflight` requests, or when
+    the expected latency of a new request is above `latency_budget`. The expected latency is the
+    rows in flight, spread over `parallelism` execution slots, times a moving average of the
+    service time of a single row; a request can't take less than its own rows.
+
+    The service time is measured per row, so a large batch doesn't make the small requests after
+    it look expensive. A request is always admitted when nothing is in flight: it can't wait
+    behind anything, and rejecting it would leave the moving average stuck above the budget.
+
+    The counters are only touched from request greenlets, which all run on the worker's main
+    thread, so no lock is needed.
+
+    :max_inflight: (int) Maximum number of concurrent requests, `0` for no limit.
+    :latency_budget: (float) Maximum expected latency in seconds, `0` for no limit.
+    :parallelism: (int) Number of requests the worker executes at the same time.
+    :smoothing: (float) Weight of the latest sample in the service time moving average.
+    """
+    def __init__(self, max_inflight=0, latency_budget=0, parallelism=1, smoothing=0.1):
+        self.max_inflight = max_inflight
+        self.latency_budget = latency_budget
+        self.parallelism = max(1, parallelism)
+        self.smoothing = smoothing
+        self.row_time = None
+        self.inflight = 0
+        self.inflight_rows = 0
+        # Counters
+        self.admitted = 0
+        self.rejected = 0
+
+    def expected_latency(self, rows=0):
+        if self.row_time is None:
+            return 0.0
+        return max(rows, (self.inflight_rows + rows) / float(self.parallelism)) * self.row_time
+
+    def try_acquire(self, rows):
+        """
+        Description:
+        -----------
+        Admits or rejects a new request.
+
+        :rows: (int) Number of observations in the request.
+
+        :returns: (int) Number of requests in flight including this one, to pass to `release()`,
+                  or `None` if the request must be rejected.
+        """
+        if self.inflight > 0 and (
+                (self.max_inflight and self.inflight >= self.max_inflight) or
+                (self.latency_budget and self.expected_latency(rows) > self.latency_budget)):
+            self.rejected += 1
+            return None
+        self.inflight += 1
+        self.inflight_rows += rows
+        self.admitted += 1
+        return self.inflight
+
+    def release(self, token, rows, elapsed, success=True):
+        self.inflight -= 1
+        self.inflight_rows -= rows
+        if not success or rows < 1:
+            # Failed requests return early and would make the service time look shorter
+            return
+        # Remove the time spent queued behind the requests that were already in flight
+        sample = elapsed / math.ceil(token / float(self.parallelism)) / rows
+        if self.row_time is None:
+            self.row_time = sample
+        else:
+            self.row_time += self.smoothing * (sample - self.row_time)
+
+    def retry_after(self):
+        # Seconds a rejected client should wait, at least the time to drain the current work
+        return max(1, int(math.ceil(self.expected_latency())))
+
+    def stats(self):
+        return {
+            'inflight': self.inflight,
+            'inflight_rows': self.inflight_rows,
+            'queued': max(0, self.inflight - self.parallelism),
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'row_service_time_seconds': self.row_time,
+            'expected_latency_seconds': self.expected_latency()
+        }
@@ -10,41 +10,279 @@ import flask
 import multiprocessing
 import subprocess
 import tarfile
-import model
-import pandas as pd
+import time
+import re
+import shutil
 import numpy as np
-import tensorflow as tf
-from tensorflow import keras
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense
-from tensorflow.keras.optimizers import Adam
-from sklearn import preprocessing
+import serialization
+from batching import MicroBatcher
+from numpy_model import NumpyModel
+import quantization
+from prediction_cache import PredictionCache
+from metrics import StageHistograms, render_gauges, process_memory
+import cpu_plan
+import transform
+from capture import CaptureWriter
+from offload import InferencePool
+from admission import AdmissionController
+from model_watcher import ModelWatcher, signature
+from model_cache import ModelCache
 
 # Adds the model.py path to the list
 prefix = '/opt/ml'
 model_path = os.path.join(prefix, 'model')
 sys.path.insert(0,model_path)
-model_cache = {}
+# Named models are served from `/opt/ml/model/<name>/`, chosen with this request header
+model_server_model_header = os.environ.get('MODEL_SERVER_MODEL_HEADER', 'X-Amzn-SageMaker-Target-Model')
+# Memory budget for the weights of the named models kept loaded
+model_server_model_cache_bytes = int(os.environ.get('MODEL_SERVER_MODEL_CACHE_BYTES', 1024 * 1024 * 1024))
+model_name_pattern = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+# Serving backend: 'tensorflow' loads the Keras 'h5' model, 'numpy' runs the exported weights without TensorFlow
+# and 'mmap' runs them from a weights file memory-mapped and shared by all the workers
+# 'tflite' serves the reduced-precision variant selected by MODEL_SERVER_TFLITE_VARIANT ('int8' or 'float16')
+model_server_backend = os.environ.get('MODEL_SERVER_BACKEND', 'tensorflow')
+model_server_tflite_variant = os.environ.get('MODEL_SERVER_TFLITE_VARIANT', 'int8')
+# Maximum number of rows accepted in a single `/invocations` request
+model_server_max_rows = int(os.environ.get('MODEL_SERVER_MAX_ROWS', 10000))
+# Load and warm up the model in the gunicorn master before forking the workers
+# The TensorFlow runtime is not fork-safe, with that backend every worker loads and warms up its own model
+model_server_preload_requested = os.environ.get('MODEL_SERVER_PRELOAD', 'false').lower() == 'true'
+model_server_preload = model_server_preload_requested and model_server_backend != 'tensorflow'
+# Number of synthetic rows scored before the model is reported as ready
+model_server_warmup_rows = int(os.environ.get('MODEL_SERVER_WARMUP_ROWS', 64))
+# Seconds between two checks for a new model file, `0` disables hot reloading
+model_server_reload_interval = float(os.environ.get('MODEL_SERVER_RELOAD_INTERVAL', 0))
+# Reference for the time-to-ready measurement
+server_start_time = time.time()
+
+# Micro-batching of concurrent requests, disabled when the batch size is `0`
+model_server_batch_size = int(os.environ.get('MODEL_SERVER_BATCH_SIZE', 0))
+model_server_batch_wait_us = int(os.environ.get('MODEL_SERVER_BATCH_WAIT_US', 2000))
+# Native threads running the model so the gevent loop is never blocked, `0` runs it inline
+model_server_inference_threads = int(os.environ.get('MODEL_SERVER_INFERENCE_THREADS', 0))
+# Admission control, requests above the concurrency limit or latency budget get a 503 straight away
+model_server_max_inflight = int(os.environ.get('MODEL_SERVER_MAX_INFLIGHT', 0))
+model_server_latency_budget_ms = float(os.environ.get('MODEL_SERVER_LATENCY_BUDGET_MS', 0))
+admission = None
+if model_server_max_inflight > 0 or model_server_latency_budget_ms > 0:
+    admission = AdmissionController(
+        max_inflight=model_server_max_inflight,
+        latency_budget=model_server_latency_budget_ms / 1000.0,
+        parallelism=max(1, model_server_inference_threads)
+    )
+# LRU cache of predictions, disabled when the number of entries is `0`
+model_server_cache_entries = int(os.environ.get('MODEL_SERVER_CACHE_ENTRIES', 0))
+model_server_cache_bytes = int(os.environ.get('MODEL_SERVER_CACHE_BYTES', 64 * 1024 * 1024))
+model_server_cache_ttl = float(os.environ.get('MODEL_SERVER_CACHE_TTL', 0))
+# Per-stage latency histograms, one memory-mapped file per worker
+model_server_metrics_dir = os.environ.get('MODEL_SERVER_METRICS_DIR', '/tmp/model_server_metrics')
+stage_metrics = StageHistograms(model_server_metrics_dir, ['decode', 'predict', 'encode', 'total'])
+# Sampled request/response capture, disabled unless a directory is set
+model_server_capture_dir = os.environ.get('MODEL_SERVER_CAPTURE_DIR')
+capture_writer = None
+if model_server_capture_dir:
+    capture_writer = CaptureWriter(
+        model_server_capture_dir,
+        sample_rate=float(os.environ.get('MODEL_SERVER_CAPTURE_SAMPLE', 1.0)),
+        max_queue=int(os.environ.get('MODEL_SERVER_CAPTURE_QUEUE', 10000)),
+        max_file_bytes=int(os.environ.get('MODEL_SERVER_CAPTURE_FILE_BYTES', 64 * 1024 * 1024)),
+        rotate_seconds=float(os.environ.get('MODEL_SERVER_CAPTURE_ROTATE_SECONDS', 300))
+    )
 
 class PredictionService(object):
     tf_model = None
+    # Incremented every time a model is loaded, invalidates cached predictions
+    generation = 0
+    batcher = None
+    cache = None
+    pool = None
+    model_cache = None
+    loader_pool = None
+    ready = False
+    time_to_ready = None
+    watcher = None
+    watcher_pid = None
+    model_signature = None
     @classmethod
-    def get_model(cls):
+    def get_model(cls, watch=True):
         if cls.tf_model is None:
-            cls.tf_model = load_model()
+            cls.model_signature = signature(model_file())
+            memory_before = process_memory()
+            model = load_model()
+            warm_up(model)
+            report_memory(memory_before, process_memory())
+            cls.set_model(model)
+            cls.time_to_ready = time.time() - server_start_time
+            cls.ready = True
+            print("Model ready in {:.3f} seconds (pid {}).".format(cls.time_to_ready, os.getpid()))
+        if watch:
+            cls.start_watcher()
         return cls.tf_model
 
     @classmethod
-    def predict(cls, input):
+    def start_watcher(cls):
+        # Once per worker; the preloading master never serves traffic, it doesn't watch the model
+        if model_server_reload_interval > 0 and cls.tf_model is not None and cls.watcher_pid != os.getpid():
+            cls.watcher_pid = os.getpid()
+            cls.watcher = ModelWatcher(model_file(), cls.model_signature, model_server_reload_interval, cls.reload)
+            cls.watcher.start()
+
+    @classmethod
+    def set_model(cls, model):
+        # A single reference swap: requests already running keep the model they started with
+        cls.tf_model = model
+        cls.generation += 1
+
+    @classmethod
+    def reload(cls):
+        # Runs in the watcher thread, the current model keeps serving until the new one is warm
+        start = time.time()
+        model = load_model()
+        warm_up(model)
+        cls.set_model(model)
+        print("Model reloaded in {:.3f} seconds (pid {}, generation {}).".format(time.time() - start, os.getpid(), cls.generation))
+
+    @classmethod
+    def get_batcher(cls):
+        if cls.batcher is None and model_server_batch_size > 0:
+            cls.batcher = MicroBatcher(cls.forward, model_server_batch_size, model_server_batch_wait_us)
+        return cls.batcher
+
+    @classmethod
+    def get_cache(cls):
+        if cls.cache is None and model_server_cache_entries > 0:
+            cls.cache = PredictionCache(model_server_cache_entries, model_server_cache_bytes, model_server_cache_ttl)
+        return cls.cache
+
+    @classmethod
+    def get_pool(cls):
+        # Created lazily so every forked worker gets its own threads
+        if cls.pool is None and model_server_inference_threads > 0:
+            cls.pool = InferencePool(model_server_inference_threads)
+        return cls.pool
+
+    @classmethod
+    def get_model_cache(cls):
+        if cls.model_cache is None:
+            # Cold models load in their own native thread so they never hold up requests for warm ones
+            cls.loader_pool = InferencePool(1)
+            cls.model_cache = ModelCache(load_named_model, model_server_model_cache_bytes, cls.loader_pool.run)
+        return cls.model_cache
+
+    @classmethod
+    def forward(cls, input):
         tf_model = cls.get_model()
+        pool = cls.get_pool()
+        if pool is not None:
+            return pool.run(tf_model.predict, input)
         return tf_model.predict(input)
 
-def load_model():
+    @classmethod
+    def predict(cls, input, model_name=None, named_model=None):
+        cache = cls.get_cache()
+        if cache is not None:
+            key = cache.key(input, model_name)
+            generation = cls.generation
+            result = cache.get(key, generation)
+            if result is not None:
+                return result
+        batcher = cls.get_batcher()
+        if model_name is not None:
+            # Named models are not micro-batched, the batcher only serves the default model
+            if named_model is None:
+                named_model = cls.get_model_cache().get(model_name)
+            pool = cls.get_pool()
+            result = pool.run(named_model.predict, input) if pool is not None else named_model.predict(input)
+        elif batcher is not None:
+            result = batcher.predict(input)
+        else:
+            result = cls.forward(input)
+        if cache is not None:
+            cache.put(key, result, generation)
+        return result
+
+    @classmethod
+    def resolve(cls, model_name=None):
+        # Model serving a request, looked up once per request so the named model statistics count one hit
+        return cls.get_model() if model_name is None else cls.get_model_cache().get(model_name)
+
+    @classmethod
+    def stats(cls):
+        # Counters of this worker, exposed by `/metrics`
+        stats = {
+            'model_ready': 1 if cls.ready else 0,
+            'model_time_to_ready_seconds': cls.time_to_ready,
+            'model_generation': cls.generation
+        }
+        stats.update(process_memory())
+        if cls.watcher is not None:
+            stats['model_reloads'] = cls.watcher.reloads
+            stats['model_reload_failures'] = cls.watcher.failures
+        if cls.batcher is not None:
+            for name, value in cls.batcher.stats().items():
+                stats['batch_' + name] = value
+        if cls.cache is not None:
+            for name, value in cls.cache.stats().items():
+                stats['cache_' + name] = value
+        if cls.pool is not None:
+            for name, value in cls.pool.stats().items():
+                stats['inference_' + name] = value
+        return stats
+
+def model_file(directory=model_path):
+    # Model artifact used by the configured backend
+    if model_server_backend == 'numpy':
+        return os.path.join(directory, 'model.npz')
+    elif model_server_backend == 'mmap':
+        return os.path.join(directory, 'model.weights')
+    elif model_server_backend == 'tflite':
+        if model_server_tflite_variant not in quantization.VARIANTS:
+            raise ValueError("Invalid MODEL_SERVER_TFLITE_VARIANT '{}', must be one of: {}.".format(model_server_tflite_variant, ', '.join(quantization.VARIANTS)))
+        return os.path.join(directory, quantization.VARIANTS[model_server_tflite_variant])
+    elif model_server_backend == 'tensorflow':
+        return os.path.join(directory, 'model.h5')
+    raise ValueError("Invalid MODEL_SERVER_BACKEND '{}', must be 'tensorflow', 'numpy', 'mmap' or 'tflite'.".format(model_server_backend))
+
+def load_model(directory=model_path):
+    path = model_file(directory)
+    if model_server_backend == 'numpy':
+        # Load the exported weights, TensorFlow is never imported
+        return NumpyModel.load(path)
+    elif model_server_backend == 'mmap':
+        return NumpyModel.load_mapped(path)
+    elif model_server_backend == 'tflite':
+        return quantization.TFLiteModel(path)
     # Load 'h5' keras model
-    model = tf.keras.models.load_model(os.path.join(model_path, 'model.h5'))
+    import tensorflow as tf
+    try:
+        # Thread pools sized by the startup CPU plan, `0` lets TensorFlow decide
+        tf.config.threading.set_intra_op_parallelism_threads(int(os.environ.get('TF_NUM_INTRAOP_THREADS', 0)))
+        tf.config.threading.set_inter_op_parallelism_threads(int(os.environ.get('TF_NUM_INTEROP_THREADS', 0)))
+    except RuntimeError:
+        # The runtime is already initialized, e.g. by a previous load in this process
+        pass
+    model = tf.keras.models.load_model(path)
     model.compile(optimizer='adam', loss='mse')
     return model
 
+def load_named_model(name):
+    model = load_model(os.path.join(model_path, name))
+    warm_up(model)
+    return model
+
+def report_memory(before, after):
+    # Resident memory of this worker around the model load, file-backed pages are shared between workers
+    if before and after:
+        print("Worker {} RSS before load: {:.1f} MB, after: {:.1f} MB (private {:.1f} MB, shared file-backed {:.1f} MB).".format(
+            os.getpid(), before['rss_bytes'] / 1e6, after['rss_bytes'] / 1e6,
+            after.get('rss_anon_bytes', 0) / 1e6, after.get('rss_file_bytes', 0) / 1e6))
+
+def warm_up(model):
+    # Score synthetic batches so graph tracing and memory allocation happen before any traffic
+    input_dim = model.input_shape[-1]
+    for rows in sorted(set([1, max(1, model_server_warmup_rows)])):
+        model.predict(np.zeros((rows, input_dim), dtype=np.float32))
+
 def sigterm_handler(nginx_pid, gunicorn_pid):
     try:
         os.kill(nginx_pid, signal.SIGQUIT)
@@ -57,19 +295,34 @@ def sigterm_handler(nginx_pid, gunicorn_pid):
 
     sys.exit(0)
 
-def start_server(timeout, workers):
-    print('Starting the inference server with {} workers.'.format(model_server_workers))
+def start_server(timeout, server_plan):
+    workers = server_plan.workers
+    print('Starting the inference server with {} workers.'.format(workers))
+    print('CPU plan: {} CPUs, {} intra-op / {} inter-op TensorFlow threads and {} BLAS threads per worker, CPU sets: {}.'.format(
+        server_plan.cpus, server_plan.intra_op_threads, server_plan.inter_op_threads, server_plan.blas_threads, server_plan.cpu_sets))
+    if model_server_preload_requested and not model_server_preload:
+        print('MODEL_SERVER_PRELOAD is ignored with the TensorFlow backend, which is not fork-safe: every worker loads its own model. Use MODEL_SERVER_BACKEND=numpy, mmap or tflite to preload.')
     # link the log streams to stdout/err so they will be logged to the container logs
     subprocess.check_call(['ln', '-sf', '/dev/stdout', '/var/log/nginx/access.log'])
     subprocess.check_call(['ln', '-sf', '/dev/stderr', '/var/log/nginx/error.log'])
 
+    # Histograms of previous runs would otherwise be aggregated with the new workers
+    shutil.rmtree(model_server_metrics_dir, ignore_errors=True)
+    os.makedirs(model_server_metrics_dir)
+
     nginx = subprocess.Popen(['nginx', '-c', '/opt/program/nginx.conf'])
-    gunicorn = subprocess.Popen(['gunicorn',
-                                 '--timeout', str(timeout),
-                                 '-k', 'gevent',
-                                 '-b', 'unix:/tmp/gunicorn.sock',
-                                 '-w', str(workers),
-                                 'wsgi:app'])
+    gunicorn_args = ['gunicorn',
+                     '--timeout', str(timeout),
+                     '-k', 'gevent',
+                     '-b', 'unix:/tmp/gunicorn.sock',
+                     '-w', str(workers),
+                     '-c', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn_conf.py')]
+    if model_server_preload:
+        # Import `wsgi` (which loads and warms up the model) in the master, workers share it after the fork
+        gunicorn_args.append('--preload')
+    # Variables set explicitly in the container environment take precedence over the plan
+    gunicorn_env = dict(cpu_plan.environment(server_plan), **os.environ)
+    gunicorn = subprocess.Popen(gunicorn_args + ['wsgi:app'], env=gunicorn_env)
 
     signal.signal(signal.SIGTERM, lambda a, b: sigterm_handler(nginx.pid, gunicorn.pid))
 
@@ -88,53 +341,135 @@ app = flask.Flask(__name__)
 
 @app.route('/ping', methods=['GET'])
 def ping():
-    health = PredictionService.get_model() is not None
+    health = PredictionService.get_model() is not None and PredictionService.ready
     status = 200 if health else 404
     return flask.Response(response='\n', status=status, mimetype='application/json')
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Stage histograms are aggregated over every worker, the other counters are for this worker only
+    stats = PredictionService.stats()
+    if capture_writer is not None:
+        for name, value in capture_writer.stats().items():
+            stats['capture_' + name] = value
+    if admission is not None:
+        for name, value in admission.stats().items():
+            stats['admission_' + name] = value
+    samples = [({'worker': os.getpid()}, stats)]
+    if PredictionService.model_cache is not None:
+        for name, model_stats in PredictionService.model_cache.stats().items():
+            samples.append(({'worker': os.getpid(), 'model': name}, dict(('named_model_' + k, v) for k, v in model_stats.items())))
+    result = stage_metrics.render() + render_gauges(samples)
+    return flask.Response(response=result, status=200, mimetype='text/plain; version=0.0.4')
+
 @app.route('/invocations', methods=['POST'])
 def invoke():
-    data = None
-    if flask.request.content_type == 'text/csv':
-        """
-        NOTE: print(flask.request.data) --> Bytes string
-        """
-        payload = np.fromstring(flask.request.data.decode('utf-8'), sep=',') # Convert `str` to `Numpy`
-        data = payload.reshape(1, -1) # Vectorize the payload
-    else:
-        return flask.Response(response="Invalid request data type, only 'text/csv' is supported.", status=415, mimetype='text/plain')
-    
-    # Get predictions
-    predictions = PredictionService.predict(data)
-
-    # Convert from Numpy to CSV
-    out = io.StringIO()
-    pd.DataFrame({'results':predictions.flatten()}).to_csv(out, header=False, index=False)
-    result = out.getvalue()
-    print("Prediction Result: {}".format(result))
-    return flask.Response(response=result, status=200, mimetype='text/csv')
+    """
+    NOTE: print(flask.request.data) --> Bytes string
+    """
+    start = time.perf_counter()
+    content_type = flask.request.mimetype
+    decoder = serialization.DECODERS.get(content_type)
+    if decoder is None:
+        return flask.Response(response="Invalid request data type, supported types are: {}.".format(', '.join(serialization.DECODERS)), status=415, mimetype='text/plain')
+    accept = serialization.response_type(flask.request.accept_mimetypes, content_type)
+    if accept is None:
+        return flask.Response(response="Invalid accept type, supported types are: {}.".format(', '.join(serialization.ENCODERS)), status=406, mimetype='text/plain')
+
+    try:
+        data = decoder(flask.request.get_data(), flask.request.mimetype_params) # Vectorize the payload, one row per observation
+    except ValueError as e:
+        return flask.Response(response="Invalid request data: {}".format(e), status=400, mimetype='text/plain')
+    if data.shape[0] > model_server_max_rows:
+        return flask.Response(response="Request has {} rows, the limit is {}.".format(data.shape[0], model_server_max_rows), status=413, mimetype='text/plain')
+    model_name = flask.request.headers.get(model_server_model_header)
+    if model_name is not None:
+        # SageMaker multi-model endpoints send the artifact name
+        if model_name.endswith('.tar.gz'):
+            model_name = model_name[:-len('.tar.gz')]
+        if not model_name_pattern.match(model_name) or not os.path.exists(model_file(os.path.join(model_path, model_name))):
+            return flask.Response(response="Unknown model '{}'.".format(model_name), status=404, mimetype='text/plain')
+    # A request of the wrong width would fail the whole micro-batch it is concatenated into
+    serving_model = PredictionService.resolve(model_name)
+    input_width = serving_model.input_shape[-1]
+    if data.ndim != 2 or data.shape[1] != input_width:
+        return flask.Response(response="Invalid request data: observations must have {} features, got shape {}.".format(input_width, data.shape), status=400, mimetype='text/plain')
+    decoded = time.perf_counter()
+    stage_metrics.observe('decode', decoded - start)
+    if admission is None:
+        return score(data, model_name, serving_model, content_type, accept, start, decoded)
+    # Admitted once decoded, the expected latency depends on the number of rows
+    rows = data.shape[0]
+    token = admission.try_acquire(rows)
+    if token is None:
+        # Shed the load quickly rather than letting every client queue until the timeout
+        return flask.Response(response="Server overloaded, retry later.", status=503, mimetype='text/plain',
+                              headers={'Retry-After': str(admission.retry_after())})
+    success = False
+    try:
+        response = score(data, model_name, serving_model, content_type, accept, start, decoded)
+        success = True
+        return response
+    finally:
+        admission.release(token, rows, time.perf_counter() - decoded, success)
+
+def score(data, model_name, serving_model, content_type, accept, start, decoded):
+    # Get predictions for the whole batch in a single call
+    predictions = PredictionService.predict(data, model_name, serving_model if model_name is not None else None)
+    predicted = time.perf_counter()
+    stage_metrics.observe('predict', predicted - decoded)
+
+    # Convert from Numpy to the response format
+    result = serialization.ENCODERS[accept](predictions)
+    encoded = time.perf_counter()
+    stage_metrics.observe('encode', encoded - predicted)
+    stage_metrics.observe('total', encoded - start)
+    if capture_writer is not None:
+        capture_writer.record(content_type, accept, data, predictions)
+    return flask.Response(response=result, status=200, mimetype=accept)
     
  
 if __name__ == '__main__':
-    print("Tensorflow Version: {}".format(tf.__version__))
-    if len(sys.argv) < 2 or ( not sys.argv[1] in [ "serve", "train", "test"] ):
-        raise Exception("Invalid argument: you must specify 'train' for training mode, 'serve' for predicting mode or 'test' for local testing.") 
+    if len(sys.argv) < 2 or ( not sys.argv[1] in [ "serve", "train", "test", "transform"] ):
+        raise Exception("Invalid argument: you must specify 'train' for training mode, 'serve' for predicting mode, 'transform' for batch scoring or 'test' for local testing.") 
 
     train = sys.argv[1] == "train"
     test = sys.argv[1] == "test"
+    batch_transform = sys.argv[1] == "transform"
+
+    if train or test:
+        # Serving never imports TensorFlow, so only the training and testing modes report its version
+        import tensorflow as tf
+        import model
+        print("Tensorflow Version: {}".format(tf.__version__))
 
     if train:
         model.train()
         
     elif test:
-        algo = 'TensorflowRegression'
-        if model_cache.get(algo) is None:
-            model_cache[algo] = load_model()
         req = eval(sys.argv[2])
-        print(model.predict(req, model_cache[algo]))
+        print(model.predict(req, load_model()))
+
+    elif batch_transform:
+        # python app.py transform [input directory] [output directory]
+        transform_input = sys.argv[2] if len(sys.argv) > 2 else os.environ.get('TRANSFORM_INPUT', '/opt/ml/processing/input/transform')
+        transform_output = sys.argv[3] if len(sys.argv) > 3 else os.environ.get('TRANSFORM_OUTPUT', '/opt/ml/processing/output/transform')
+        transform_processes = int(os.environ.get('TRANSFORM_PROCESSES', 0)) or len(cpu_plan.available_cpus())
+        transform_chunk_rows = int(os.environ.get('TRANSFORM_CHUNK_ROWS', 10000))
+        # A single thread per scoring process, the parallelism comes from the process pool
+        transform_plan = cpu_plan.plan(workers=transform_processes, threads_per_worker=1)
+        os.environ.update(dict(cpu_plan.environment(transform_plan), **os.environ))
+        transform.transform(transform_input, transform_output, load_model, transform_processes, transform_chunk_rows)
 
     else:
-        cpu_count = multiprocessing.cpu_count()
         model_server_timeout = os.environ.get('MODEL_SERVER_TIMEOUT', 60)
-        model_server_workers = int(os.environ.get('MODEL_SERVER_WORKERS', cpu_count))
-        start_server(model_server_timeout, model_server_workers)
\ No newline at end of file
+        # Derived from the CPUs available to the container when not set
+        model_server_workers = os.environ.get('MODEL_SERVER_WORKERS')
+        model_server_threads = os.environ.get('MODEL_SERVER_THREADS_PER_WORKER')
+        model_server_pin_workers = os.environ.get('MODEL_SERVER_PIN_WORKERS', 'false').lower() == 'true'
+        server_plan = cpu_plan.plan(
+            workers=int(model_server_workers) if model_server_workers else None,
+            threads_per_worker=int(model_server_threads) if model_server_threads else None,
+            pin=model_server_pin_workers
+        )
+        start_server(model_server_timeout, server_plan)
\ No newline at end of file
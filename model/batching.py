@@ -0,0 +1,117 @@
+import threading
+import numpy as np
+
+
+class _Batch(object):
+    def __init__(self):
+        self.inputs = []
+        self.rows = 0
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher(object):
+    """
+    Description:
+    -----------
+    Collects concurrent prediction requests into a single forward pass.
+
+    The first request to arrive opens a batch and waits until either `max_batch_size` rows
+    have joined or `max_wait_us` microseconds have passed. It then runs `predict_fn` once on
+    the stacked rows and hands every caller back its own slice of the output.
+
+    :predict_fn: (callable) Function mapping a 2D NumPy array to a 2D NumPy array of predictions.
+    :max_batch_size: (int) Maximum number of rows in one forward pass.
+    :max_wait_us: (int) Maximum time in microseconds the first request waits for others to join.
+    """
+    def __init__(self, predict_fn, max_batch_size, max_wait_us):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_us / 1e6
+        self._lock = threading.Lock()
+        self._batch = None
+        # Counters
+        self.requests = 0
+        self.batches = 0
+        self.rows = 0
+
+    def predict(self, data):
+        rows = data.shape[0]
+        if rows >= self.max_batch_size:
+            # Already a full batch, nothing to gain by waiting
+            with self._lock:
+                self.requests += 1
+                self.batches += 1
+                self.rows += rows
+            return self.predict_fn(data)
+
+        with self._lock:
+            self.requests += 1
+            batch = self._batch
+            if batch is None or batch.rows + rows > self.max_batch_size:
+                if batch is not None:
+                    # Dispatch the current batch now and start a new one
+                    self._close(batch)
+                batch = self._batch = _Batch()
+                leader = True
+            else:
+                leader = False
+            offset = batch.rows
+            batch.inputs.append(data)
+            batch.rows += rows
+            if batch.rows >= self.max_batch_size:
+                self._close(batch)
+
+        if leader:
+            batch.full.wait(self.max_wait)
+            with self._lock:
+                self._close(batch)
+                self.batches += 1
+                self.rows += batch.rows
+            self._run(batch)
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.result[offset:offset + rows]
+
+    def _close(self, batch):
+        # Caller must hold `self._lock`
+        if self._batch is batch:
+            self._batch = None
+        batch.full.set()
+
+    def _run(self, batch):
+        try:
+            if len(batch.inputs) == 1:
+                batch.result = self.predict_fn(batch.inputs[0])
+            else:
+                batch.result = self.predict_fn(np.concatenate(batch.inputs))
+        except Exception as e:
+            batch.error = e
+        finally:
+            batch.inputs = None
+            batch.done.set()
+
+    def stats(self):
+        """
+        Description:
+        -----------
+        Returns the batching counters.
+
+        :returns: (dict) Number of requests, forward passes and rows, along with the average
+                  batch fill ratio (rows per forward pass divided by `max_batch_size`).
+        """
+        with self._lock:
+            requests, batches, rows = self.requests, self.batches, self.rows
+        fill_ratio = rows / float(batches * self.max_batch_size) if batches else 0.0
+        return {
+            'requests': requests,
+            'batches': batches,
+            'rows': rows,
+            'max_batch_size': self.max_batch_size,
+            'fill_ratio': fill_ratio
+        }
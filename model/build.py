@@ -28,7 +28,11 @@ def create_model_package(model_name, package_group_name, container_registry_uri,
                 }
             ],
             "SupportedContentTypes": [ 
-                "text/csv" 
+                "text/csv",
+                "application/jsonlines",
+                "application/x-npy",
+                "application/x-float32",
+                "application/x-float64"
             ],
             "SupportedRealtimeInferenceInstanceTypes": [ 
                 "ml.t2.large",
@@ -36,7 +40,11 @@ def create_model_package(model_name, package_group_name, container_registry_uri,
                 "ml.c5.xlarge"
             ],
             "SupportedResponseMIMETypes": [ 
-                "text/csv" 
+                "text/csv",
+                "application/jsonlines",
+                "application/x-npy",
+                "application/x-float32",
+                "application/x-float64"
             ],
             "SupportedTransformInstanceTypes": [ 
                 "ml.c5.xlarge"
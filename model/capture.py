@@ -0,0 +1,138 @@
+import atexit
+import gzip
+import json
+import os
+import random
+import time
+from collections import deque
+
+try:
+    # Under gunicorn's gevent worker `threading` and `time.sleep` are monkey-patched,
+    # the writer must run in a real OS thread so compression never blocks the event loop
+    from gevent.monkey import get_original
+    start_new_thread, allocate_lock = get_original('_thread', ['start_new_thread', 'allocate_lock'])
+    sleep = get_original('time', 'sleep')
+except ImportError:
+    from _thread import start_new_thread, allocate_lock
+    from time import sleep
+
+
+class CaptureWriter(object):
+    """
+    Description:
+    -----------
+    Samples request/response pairs and writes them in the background as rotated, gzip compressed
+    JSON-lines files.
+
+    The request path only appends to a bounded in-memory queue; when the queue is full the record
+    is dropped and counted instead of blocking the request.
+
+    :directory: (str) Directory the capture files are written to.
+    :sample_rate: (float) Fraction of the requests to capture, between `0` and `1`.
+    :max_queue: (int) Maximum number of records waiting to be written.
+    :max_file_bytes: (int) Uncompressed size after which a new file is started.
+    :rotate_seconds: (float) Age after which a new file is started.
+    :flush_interval: (float) Seconds between two writes of the queued records.
+    """
+    def __init__(self, directory, sample_rate=1.0, max_queue=10000, max_file_bytes=64 * 1024 * 1024,
+                 rotate_seconds=300, flush_interval=1.0):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_queue = max_queue
+        self.max_file_bytes = max_file_bytes
+        self.rotate_seconds = rotate_seconds
+        self.flush_interval = flush_interval
+        # `deque` appends and pops are thread-safe, no lock is shared with the writer thread
+        self._queue = deque()
+        # Serializes the writer thread and the final flush at exit
+        self._write_lock = allocate_lock()
+        self._pid = None
+        self._file = None
+        self._file_path = None
+        self._file_bytes = 0
+        self._file_opened = 0
+        # Counters
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+        self.files = 0
+
+    def record(self, content_type, accept, data, predictions):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        if self._pid != os.getpid():
+            # Started lazily, and again after a fork, so every worker has its own writer
+            self._pid = os.getpid()
+            self._file = None
+            start_new_thread(self._run, ())
+            atexit.register(self.close)
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.append((time.time(), content_type, accept, data, predictions))
+        self.captured += 1
+
+    def _run(self):
+        while True:
+            sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print('Capture writer error: {}'.format(e))
+
+    def flush(self):
+        with self._write_lock:
+            self._flush()
+
+    def _flush(self):
+        lines = []
+        while self._queue:
+            timestamp, content_type, accept, data, predictions = self._queue.popleft()
+            lines.append(json.dumps({
+                'timestamp': timestamp,
+                'content_type': content_type,
+                'accept': accept,
+                'input': data.tolist(),
+                'output': predictions.tolist()
+            }) + '\n')
+        if lines:
+            self._write(''.join(lines))
+            self.written += len(lines)
+        elif self._file is not None and time.time() - self._file_opened > self.rotate_seconds:
+            self._close_file()
+
+    def _write(self, text):
+        if self._file is not None and (self._file_bytes > self.max_file_bytes or
+                                       time.time() - self._file_opened > self.rotate_seconds):
+            self._close_file()
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._file_opened = time.time()
+            self._file_path = os.path.join(self.directory, 'capture-{}-{}-{:05d}.jsonl.gz'.format(
+                time.strftime('%Y%m%dT%H%M%S', time.gmtime(self._file_opened)), os.getpid(), self.files))
+            # Written under a temporary name, consumers only see complete files
+            self._file = gzip.open(self._file_path + '.part', 'wt')
+            self._file_bytes = 0
+            self.files += 1
+        self._file.write(text)
+        self._file_bytes += len(text)
+
+    def _close_file(self):
+        self._file.close()
+        os.rename(self._file_path + '.part', self._file_path)
+        self._file = None
+
+    def close(self):
+        with self._write_lock:
+            self._flush()
+            if self._file is not None:
+                self._close_file()
+
+    def stats(self):
+        return {
+            'captured': self.captured,
+            'dropped': self.dropped,
+            'written': self.written,
+            'queued': len(self._queue),
+            'files': self.files
+        }
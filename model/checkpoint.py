@@ -0,0 +1,199 @@
+import json
+import os
+import re
+import threading
+import numpy as np
+from tensorflow import keras
+import dataset_cache
+
+# Sagemaker syncs this directory with the `CheckpointConfig` S3 location and restores it on restart
+default_checkpoint_dir = '/opt/ml/checkpoints'
+
+checkpoint_file = re.compile(r'^ckpt-(\d+)\.npz$')
+
+# Hyperparameters of the architecture and optimizer, a checkpoint only resumes a job with the same values
+FINGERPRINT_KEYS = ['layers', 'dense_layer', 'batch_size', 'performance_mode', 'learning_rate', 'base_batch_size', 'lr_scaling']
+
+
+def _optimizer_variables(optimizer):
+    # `variables` is a method of the legacy optimizers and a property of the new ones
+    variables = optimizer.variables
+    return list(variables() if callable(variables) else variables)
+
+
+def build_optimizer(model):
+    """
+    Description:
+    -----------
+    Creates the optimizer slot variables, which Keras otherwise only creates on the first step.
+
+    No step is taken: the iteration count stays at 0, so a run without checkpoint trains exactly
+    as before, and no gradients are applied, which isn't allowed in the cross-replica context of a
+    distribution strategy scope.
+
+    :model: (keras.Model) Compiled model.
+    """
+    variables = model.trainable_variables
+    if hasattr(model.optimizer, '_create_all_weights'):
+        # `OptimizerV2`, the optimizers of the TensorFlow 2.7 image
+        model.optimizer._create_all_weights(variables)
+    else:
+        # Optimizers of Keras 2.11 and later
+        model.optimizer.build(variables)
+
+
+def fingerprint(params, input_files, *extra):
+    """
+    Description:
+    -----------
+    Identifies the training run a checkpoint belongs to.
+
+    The `CheckpointConfig` location is usually the same for every job of a pipeline, so without it
+    a job on new data or other hyperparameters would resume from the previous job's weights.
+
+    :params: (dict) Hyperparameters, the `FINGERPRINT_KEYS` are used.
+    :input_files: (list) Training and validation files, their content is hashed.
+    :extra: (str) Anything else the run depends on, e.g. the number of workers.
+
+    :returns: (str) Hex digest.
+    """
+    hyperparameters = json.dumps(dict((key, params.get(key)) for key in FINGERPRINT_KEYS), sort_keys=True)
+    return dataset_cache.content_hash(sorted(input_files), hyperparameters, *extra)
+
+
+def _written_by(path):
+    # Fingerprint stored in the checkpoint, `None` if it can't be read
+    try:
+        with np.load(path, allow_pickle=False) as state:
+            return str(state['fingerprint'])
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+
+
+def list_checkpoints(directory):
+    # Checkpoint files sorted from the oldest to the newest epoch
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    checkpoints = [(int(match.group(1)), os.path.join(directory, name)) for name, match in ((name, checkpoint_file.match(name)) for name in names) if match]
+    return sorted(checkpoints)
+
+
+def restore(model, directory, fingerprint, epochs):
+    """
+    Description:
+    -----------
+    Restores the weights and optimizer state of the newest valid checkpoint.
+
+    Checkpoints that can't be read, e.g. truncated by an interrupted upload, that were written by a
+    run on other data or hyperparameters, or for a different architecture are skipped. So are
+    checkpoints at or past `epochs`, resuming from them would train no epoch at all.
+
+    :model: (keras.Model) Compiled model.
+    :directory: (str) Checkpoint directory.
+    :fingerprint: (str) Fingerprint of this run, returned by `fingerprint()`.
+    :epochs: (int) Number of epochs of this run.
+
+    :returns: (int) Epoch to resume from, `0` if there is no usable checkpoint.
+    """
+    build_optimizer(model)
+    model_variables = model.weights
+    optimizer_variables = _optimizer_variables(model.optimizer)
+    for epoch, path in reversed(list_checkpoints(directory)):
+        try:
+            with np.load(path, allow_pickle=False) as state:
+                written_by = str(state['fingerprint'])
+                weights = [state['weight_{}'.format(i)] for i in range(int(state['weights']))]
+                slots = [state['optimizer_{}'.format(i)] for i in range(int(state['optimizer']))]
+        except (IOError, OSError, ValueError, KeyError) as e:
+            print("Skipping unreadable checkpoint {}: {}".format(path, e))
+            continue
+        if written_by != fingerprint:
+            print("WARNING: skipping checkpoint {}, it was written by a run on other data or hyperparameters".format(path))
+            continue
+        if epoch >= epochs:
+            print("WARNING: skipping checkpoint {}, its epoch {} is not below the {} epochs of this run".format(path, epoch, epochs))
+            continue
+        if [w.shape for w in weights] != [tuple(v.shape) for v in model_variables] or \
+           [w.shape for w in slots] != [tuple(v.shape) for v in optimizer_variables]:
+            print("Skipping checkpoint {}, it doesn't match the model".format(path))
+            continue
+        model.set_weights(weights)
+        for variable, value in zip(optimizer_variables, slots):
+            variable.assign(value)
+        print("Resuming from checkpoint {} (epoch {})".format(path, epoch))
+        return epoch
+    return 0
+
+
+class CheckpointCallback(keras.callbacks.Callback):
+    """
+    Description:
+    -----------
+    Saves the weights and optimizer state every `every` epochs without stalling training.
+
+    The state is copied to NumPy at the end of the epoch, which is cheap, and compressed and
+    written by a background thread. At most one write is in flight; files are written under a
+    temporary name and renamed, so a checkpoint is either complete or absent. Checkpoints of other
+    runs are removed.
+
+    :directory: (str) Checkpoint directory.
+    :fingerprint: (str) Fingerprint of this run, returned by `fingerprint()`.
+    :every: (int) Epochs between checkpoints.
+    :keep: (int) Number of newest checkpoints kept, `0` to keep all of them.
+    """
+    def __init__(self, directory, fingerprint, every=10, keep=3):
+        super(CheckpointCallback, self).__init__()
+        self.directory = directory
+        self.fingerprint = fingerprint
+        self.every = max(1, int(every))
+        self.keep = int(keep)
+        self._writer = None
+        os.makedirs(directory, exist_ok=True)
+
+    def on_epoch_end(self, epoch, logs=None):
+        # Keras numbers epochs from 0, a checkpoint of epoch `n` resumes with `initial_epoch=n`
+        completed = epoch + 1
+        if completed % self.every == 0:
+            self.save(completed)
+
+    def on_train_end(self, logs=None):
+        self.wait()
+
+    def save(self, epoch):
+        weights = self.model.get_weights()
+        slots = _optimizer_variables(self.model.optimizer)
+        state = {'fingerprint': np.array(self.fingerprint), 'weights': np.array(len(weights)), 'optimizer': np.array(len(slots))}
+        for i, weight in enumerate(weights):
+            state['weight_{}'.format(i)] = weight
+        for i, variable in enumerate(slots):
+            state['optimizer_{}'.format(i)] = np.array(variable.numpy())
+        self.wait()
+        self._writer = threading.Thread(target=self._write, args=(epoch, state), daemon=True)
+        self._writer.start()
+
+    def wait(self):
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+
+    def _write(self, epoch, state):
+        path = os.path.join(self.directory, 'ckpt-{:06d}.npz'.format(epoch))
+        try:
+            with open(path + '.tmp', 'wb') as f:
+                np.savez_compressed(f, **state)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            print("Unable to write checkpoint {}: {}".format(path, e))
+            return
+        # Checkpoints of other runs can't be resumed by this one, and their higher epochs would
+        # otherwise push this run's own checkpoints out of the newest `keep`
+        paths = [old for _, old in list_checkpoints(self.directory)]
+        checkpoints = [old for old in paths if _written_by(old) == self.fingerprint]
+        stale = [old for old in paths if old not in checkpoints]
+        for old in stale + (checkpoints[:-self.keep] if self.keep > 0 else []):
+            try:
+                os.remove(old)
+            except OSError:
+                pass
@@ -0,0 +1,104 @@
+import math
+import multiprocessing
+import os
+from collections import namedtuple
+
+CpuPlan = namedtuple('CpuPlan', ['cpus', 'workers', 'intra_op_threads', 'inter_op_threads', 'blas_threads', 'cpu_sets'])
+
+
+def cgroup_cpu_quota():
+    """
+    Description:
+    -----------
+    Reads the container CPU quota from the cgroup (v2 or v1) filesystem.
+
+    :returns: (float) Number of CPUs allowed by the quota, or `None` if there is no quota.
+    """
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            return float(quota) / float(period)
+        return None
+    except (IOError, OSError, ValueError):
+        pass
+    try:
+        # cgroup v1: a quota of -1 means no limit
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return float(quota) / float(period)
+    except (IOError, OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus():
+    """
+    Description:
+    -----------
+    Lists the CPUs this process may run on, limited by the affinity mask and the cgroup quota.
+
+    :returns: (list) CPU ids usable by the server.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(multiprocessing.cpu_count()))
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        # A fractional quota can't keep an extra core busy without being throttled
+        cpus = cpus[:max(1, min(len(cpus), int(math.floor(quota))))]
+    return cpus
+
+
+def plan(workers=None, threads_per_worker=None, pin=False):
+    """
+    Description:
+    -----------
+    Splits the available CPUs between the gunicorn workers and their thread pools.
+
+    By default every worker gets a single thread, which avoids workers x threads oversubscription
+    and keeps tail latency stable under load.
+
+    :workers: (int) Number of workers, derived from the CPUs and `threads_per_worker` if `None`.
+    :threads_per_worker: (int) TensorFlow intra-op and BLAS threads per worker, derived if `None`.
+    :pin: (bool) Whether to assign every worker its own set of CPUs.
+
+    :returns: (CpuPlan) The chosen plan.
+    """
+    cpus = available_cpus()
+    if threads_per_worker is None:
+        threads_per_worker = 1 if workers is None else max(1, len(cpus) // workers)
+    if workers is None:
+        workers = max(1, len(cpus) // threads_per_worker)
+    cpu_sets = None
+    if pin:
+        # Consecutive CPUs per worker, wrapping around when the workers oversubscribe the CPUs
+        cpu_sets = [sorted(set(cpus[(w * threads_per_worker + t) % len(cpus)] for t in range(threads_per_worker))) for w in range(workers)]
+    return CpuPlan(len(cpus), workers, threads_per_worker, 1, threads_per_worker, cpu_sets)
+
+
+def environment(cpu_plan):
+    """
+    Description:
+    -----------
+    Environment variables applying the plan to the worker processes.
+
+    :cpu_plan: (CpuPlan) Plan returned by `plan()`.
+
+    :returns: (dict) Environment variables for the gunicorn process.
+    """
+    env = {
+        'TF_NUM_INTRAOP_THREADS': str(cpu_plan.intra_op_threads),
+        'TF_NUM_INTEROP_THREADS': str(cpu_plan.inter_op_threads),
+        'OMP_NUM_THREADS': str(cpu_plan.blas_threads),
+        'OPENBLAS_NUM_THREADS': str(cpu_plan.blas_threads),
+        'MKL_NUM_THREADS': str(cpu_plan.blas_threads)
+    }
+    if cpu_plan.cpu_sets:
+        env['MODEL_SERVER_CPU_SETS'] = ';'.join(','.join(map(str, cpu_set)) for cpu_set in cpu_plan.cpu_sets)
+    return env
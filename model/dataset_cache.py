@@ -0,0 +1,82 @@
+import hashlib
+import os
+import shutil
+import numpy as np
+
+# Bump when the parsing or pre-processing changes, so arrays cached by an older version aren't reused
+CACHE_VERSION = 1
+
+
+def content_hash(paths, *extra):
+    """
+    Description:
+    -----------
+    Hashes the content of the input files.
+
+    Reading the raw bytes is much cheaper than parsing them, and unlike modification times the hash
+    stays valid when Sagemaker copies the same S3 objects into a new container.
+
+    :paths: (list) Input file paths, the order matters.
+    :extra: (str) Anything else the cached arrays depend on, e.g. the column names.
+
+    :returns: (str) Hex digest.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update('{}{}'.format(CACHE_VERSION, extra).encode('utf-8'))
+    for path in paths:
+        digest.update(os.path.basename(path).encode('utf-8'))
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def load(directory, key, names):
+    """
+    Description:
+    -----------
+    Memory-maps the arrays cached under `key`.
+
+    :directory: (str) Cache directory.
+    :key: (str) Hash returned by `content_hash()`.
+    :names: (list) Names of the arrays.
+
+    :returns: (tuple) Read-only arrays in the order of `names`, or `None` on a cache miss.
+    """
+    entry = os.path.join(directory, key)
+    try:
+        return tuple(np.load(os.path.join(entry, name + '.npy'), mmap_mode='r', allow_pickle=False) for name in names)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def store(directory, key, arrays):
+    """
+    Description:
+    -----------
+    Writes the arrays as `.npy` files under `key`.
+
+    The entry is written to a temporary directory and renamed, so a concurrent run never sees a
+    partial entry. Failing to write the cache, e.g. on a read-only input volume, is not an error.
+
+    :directory: (str) Cache directory.
+    :key: (str) Hash returned by `content_hash()`.
+    :arrays: (dict) Array name to NumPy Array.
+
+    :returns: (bool) `True` if the entry was written.
+    """
+    entry = os.path.join(directory, key)
+    tmp = '{}.tmp{}'.format(entry, os.getpid())
+    try:
+        os.makedirs(tmp, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, name + '.npy'), np.ascontiguousarray(array), allow_pickle=False)
+        os.replace(tmp, entry)
+        return True
+    except OSError as e:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if os.path.isdir(entry):
+            # Another run with the same inputs stored it first
+            return True
+        print("Unable to cache the parsed dataset in {}: {}".format(directory, e))
+        return False
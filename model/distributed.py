@@ -0,0 +1,98 @@
+import json
+import os
+
+# Sagemaker describes the hosts of the training cluster here
+resource_config_path = '/opt/ml/input/config/resourceconfig.json'
+
+# Port of the TensorFlow collective ops between the training hosts
+default_port = 2222
+
+
+def cluster_spec(resource_config_path=resource_config_path, port=default_port):
+    """
+    Description:
+    -----------
+    Builds the `TF_CONFIG` of this host from the Sagemaker resource configuration.
+
+    A `TF_CONFIG` already in the environment, e.g. set by `utils/launch_local_training.py`, takes
+    precedence.
+
+    :resource_config_path: (str) Path of `resourceconfig.json`.
+    :port: (int) Port the workers listen on.
+
+    :returns: (dict) `TF_CONFIG`, or `None` for a single host.
+    """
+    if os.environ.get('TF_CONFIG'):
+        tf_config = json.loads(os.environ['TF_CONFIG'])
+    else:
+        try:
+            with open(resource_config_path, 'r') as f:
+                resource_config = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        hosts = sorted(resource_config['hosts'])
+        tf_config = {
+            'cluster': {'worker': ['{}:{}'.format(host, port) for host in hosts]},
+            'task': {'type': 'worker', 'index': hosts.index(resource_config['current_host'])}
+        }
+    if len(tf_config['cluster'].get('worker', [])) < 2:
+        return None
+    return tf_config
+
+
+class Cluster(object):
+    """
+    Description:
+    -----------
+    Data-parallel training setup of this host.
+
+    With several hosts, every host runs one worker of a `MultiWorkerMirroredStrategy`; each step
+    every worker computes the gradients of its shard of the global batch and the gradients are
+    all-reduced, so the throughput scales with the number of hosts. With a single host the default
+    strategy is used and training is unchanged.
+
+    The strategy must be created before any other TensorFlow operation runs.
+
+    :tf_config: (dict) Cluster returned by `cluster_spec()`, `None` for a single host.
+    """
+    def __init__(self, tf_config=None):
+        import tensorflow as tf
+        self.tf_config = tf_config
+        if tf_config is None:
+            self.strategy = tf.distribute.get_strategy()
+            self.index = 0
+            self.workers = 1
+        else:
+            os.environ['TF_CONFIG'] = json.dumps(tf_config)
+            self.strategy = tf.distribute.MultiWorkerMirroredStrategy()
+            self.index = int(tf_config['task']['index'])
+            self.workers = len(tf_config['cluster']['worker'])
+
+    @property
+    def is_chief(self):
+        # Only the first worker writes the model, the checkpoints and the reports
+        return self.index == 0
+
+    @property
+    def distributed(self):
+        return self.workers > 1
+
+    def shard(self, dataset):
+        """
+        Description:
+        -----------
+        Splits a dataset between the workers.
+
+        Datasets read from files are split by file when every worker gets at least one file,
+        otherwise by record; every worker reads only its share of the input.
+
+        :dataset: (tf.data.Dataset) Batched dataset, batched with the global batch size.
+
+        :returns: (tf.data.Dataset) Dataset to pass to `fit()`.
+        """
+        if not self.distributed or dataset is None:
+            return dataset
+        import tensorflow as tf
+        options = tf.data.Options()
+        options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.AUTO
+        return dataset.with_options(options)
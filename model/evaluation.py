@@ -5,11 +5,12 @@ import os
 import tarfile
 import pandas as pd
 import numpy as np
+import time
 import traceback
 import tensorflow as tf
 from tensorflow import keras
-from sklearn.metrics import mean_squared_error
 from sklearn import preprocessing
+import quantization
 
 tf.get_logger().setLevel('ERROR')
 
@@ -20,6 +21,19 @@ input_path = os.path.join(prefix, 'input')
 output_path = os.path.join(prefix, 'output')
 evaluation_path =  os.path.join(output_path, 'evaluation')
 
+# Maximum relative RMSE increase for a quantized variant to be accepted
+max_rmse_increase = float(os.environ.get('QuantizationMaxRmseIncrease', 0.02))
+# Number of timed prediction passes when measuring the speedup
+timing_repeats = int(os.environ.get('QuantizationTimingRepeats', 10))
+# Test observations read, normalized and scored at a time
+chunk_rows = int(os.environ.get('EvaluationChunkRows', 100000))
+# Observations per prediction batch of the float model
+predict_batch_size = int(os.environ.get('EvaluationBatchSize', 4096))
+
+# Specify the Column names in order to manipulate the specific columns for pre-processing
+column_names = ["rings", "length", "diameter", "height", "whole weight", 
+    "shucked weight", "viscera weight", "shell weight", "sex_F", "sex_I", "sex_M"]
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 logger.addHandler(logging.StreamHandler())
@@ -33,6 +47,115 @@ def load_model():
     model.compile(optimizer="adam", loss="mse")
     return model
 
+class ResidualStats(object):
+    """
+    Description:
+    -----------
+    Online accumulator of the prediction residuals, updated one batch at a time.
+
+    Batches are merged with the parallel form of Welford's algorithm, so the mean squared error and
+    the residual standard deviation are numerically stable and use constant memory whatever the
+    number of observations.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.mean_square = 0.0
+
+    def update(self, y, predictions):
+        # Flatten the (n, 1) model output, subtracting it from (n,) labels would broadcast to (n, n)
+        residuals = np.asarray(y, dtype=np.float64).reshape(-1) - np.asarray(predictions, dtype=np.float64).reshape(-1)
+        n = residuals.shape[0]
+        if n == 0:
+            return
+        batch_mean = residuals.mean()
+        batch_m2 = np.square(residuals - batch_mean).sum()
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += batch_m2 + delta * delta * self.count * n / total
+        self.mean_square += (np.square(residuals).mean() - self.mean_square) * n / total
+        self.count = total
+
+    @property
+    def mse(self):
+        return float(self.mean_square)
+
+    @property
+    def rmse(self):
+        return float(np.sqrt(self.mean_square))
+
+    @property
+    def std(self):
+        # Population standard deviation, same as `np.std()`
+        return float(np.sqrt(self.m2 / self.count)) if self.count else 0.0
+
+def test_chunks(path):
+    # Normalized features and labels of `chunk_rows` observations at a time
+    for chunk in pd.read_csv(path, sep=',', names=column_names, chunksize=chunk_rows):
+        y = chunk['rings'].to_numpy()
+        x = preprocessing.normalize(chunk.drop(['rings'], axis=1).to_numpy())
+        yield x, y
+
+def best_time(predict, x):
+    # Fastest of several passes, after one untimed pass to warm the model up
+    predict(x)
+    timings = []
+    for _ in range(timing_repeats):
+        start = time.perf_counter()
+        predict(x)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def load_quantized():
+    # Quantized variants found in the model artifact
+    models = {}
+    for variant, file_name in quantization.VARIANTS.items():
+        if not os.path.exists(file_name):
+            logger.info("Quantized variant {} not found in the model artifact.".format(variant))
+            continue
+        models[variant] = quantization.TFLiteModel(file_name)
+    return models
+
+def quantization_report(stats, speedups, rmse):
+    """
+    Description:
+    -----------
+    Scores every quantized variant against the float model.
+
+    :stats: (dict) Variant name to the `ResidualStats` of its predictions.
+    :speedups: (dict) Variant name to its prediction speedup over the float model.
+    :rmse: (float) RMSE of the float model.
+
+    :returns: (dict) Variant name to its RMSE, RMSE change, speedup and acceptance.
+    """
+    results = {}
+    for variant, variant_stats in stats.items():
+        quantized_rmse = variant_stats.rmse
+        speedup = speedups[variant]
+        rmse_increase = (quantized_rmse - rmse) / rmse if rmse > 0 else 0.0
+        accepted = rmse_increase <= max_rmse_increase
+        logger.info("Quantized variant {}: RMSE {} ({:+.2%}), speedup {:.2f}x, {}.".format(
+            variant, quantized_rmse, rmse_increase, speedup, "accepted" if accepted else "rejected"))
+        results[variant] = {
+            'rmse': {
+                'value': quantized_rmse
+            },
+            'rmse_delta': {
+                'value': quantized_rmse - rmse
+            },
+            'speedup': {
+                'value': speedup
+            },
+            'accepted': accepted
+        }
+    return results
+
+def predict_float(model):
+    # Large batches, the default of 32 rows makes prediction dominated by per-batch overhead
+    return lambda x: model.predict(x, batch_size=predict_batch_size, verbose=0)
+
 if __name__ == "__main__":
     logger.info("Evaluation mode ...")
     
@@ -41,24 +164,31 @@ if __name__ == "__main__":
     
         # Load 'h5' keras model
         model = load_model()
+        predict = predict_float(model)
+        quantized_models = load_quantized()
 
-        # Specify the Column names in order to manipulate the specific columns for pre-processing
-        column_names = ["rings", "length", "diameter", "height", "whole weight", 
-            "shucked weight", "viscera weight", "shell weight", "sex_F", "sex_I", "sex_M"]
-        
+        # Single pass over the test set, scoring the float model and the quantized variants together
         logger.info("Reading test data.")
-        test_data = pd.read_csv(os.path.join(test_path, 'test.csv'), sep=',', names=column_names)
-        y_test = test_data['rings'].to_numpy()
-        x_test = test_data.drop(['rings'], axis=1).to_numpy()
-        x_test = preprocessing.normalize(x_test)
-        
-        #run predictions
-        predictions_ = model.predict(x_test)
+        stats = ResidualStats()
+        quantized_stats = {variant: ResidualStats() for variant in quantized_models}
+        speedups = {}
+        for x_test, y_test in test_chunks(os.path.join(test_path, 'test.csv')):
+            if stats.count == 0:
+                # Time the first chunk only, memory must not depend on the test set size
+                float_time = best_time(predict, x_test)
+                for variant, quantized_model in quantized_models.items():
+                    speedups[variant] = float_time / best_time(quantized_model.predict, x_test)
+            stats.update(y_test, predict(x_test))
+            for variant, quantized_model in quantized_models.items():
+                quantized_stats[variant].update(y_test, quantized_model.predict(x_test))
+        if stats.count == 0:
+            raise ValueError("The test set is empty.")
+        logger.info("Evaluated {} observations.".format(stats.count))
         
         # Calculate the metrics
-        mse = mean_squared_error(y_test, predictions_)
-        rmse = mean_squared_error(y_test, predictions_, squared=False)
-        std = np.std(np.array(y_test) - np.array(predictions_))
+        mse = stats.mse
+        rmse = stats.rmse
+        std = stats.std
         # Save Metrics to S3 for Model Package
         logger.info("Root Mean Square Error: {}".format(rmse))
         logger.info("Mean Square Error: {}".format(mse))
@@ -75,6 +205,8 @@ if __name__ == "__main__":
                     'value': std,
                 },
             },
+            # Reduced-precision variants, rejected when their RMSE is more than `max_rmse_increase` worse
+            "quantization": quantization_report(quantized_stats, speedups, rmse),
         }
         
 
@@ -0,0 +1,26 @@
+# Gunicorn server hooks, loaded with `-c` by `app.start_server()`.
+import os
+import sys
+
+# CPU sets chosen by `cpu_plan.plan()`, one per worker slot: "0,1;2,3"
+cpu_sets = [[int(cpu) for cpu in cpu_set.split(',')] for cpu_set in os.environ.get('MODEL_SERVER_CPU_SETS', '').split(';') if cpu_set]
+
+
+def pre_fork(server, worker):
+    # Runs in the master: give the new worker the first CPU set not held by a live worker,
+    # so a respawned worker takes over the cores of the one it replaces
+    if cpu_sets:
+        used = set(getattr(w, 'cpu_slot', None) for w in server.WORKERS.values())
+        free = [slot for slot in range(len(cpu_sets)) if slot not in used]
+        worker.cpu_slot = free[0] if free else len(server.WORKERS) % len(cpu_sets)
+
+
+def post_fork(server, worker):
+    if cpu_sets:
+        cpus = cpu_sets[worker.cpu_slot]
+        os.sched_setaffinity(0, cpus)
+        server.log.info("Worker %s pinned to CPUs %s", worker.pid, cpus)
+    # With `--preload` the model was loaded in the master, watch it from the worker for reloads.
+    # Otherwise `app` isn't imported yet and the worker starts watching on its first model load.
+    if 'app' in sys.modules:
+        sys.modules['app'].PredictionService.start_watcher()
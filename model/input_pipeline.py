@@ -0,0 +1,99 @@
+import json
+import os
+import tensorflow as tf
+
+# Specify the Column names in order to manipulate the specific columns for pre-processing
+COLUMN_NAMES = ["rings", "length", "diameter", "height", "whole weight",
+                "shucked weight", "viscera weight", "shell weight", "sex_F", "sex_I", "sex_M"]
+
+# Sagemaker describes the input mode of every channel here
+input_config_path = '/opt/ml/input/config/inputdataconfig.json'
+
+
+def channel_input_mode(channel_name):
+    """
+    Description:
+    -----------
+    Reads the input mode Sagemaker configured for a channel.
+
+    :channel_name: (str) Name of the channel.
+
+    :returns: (str) 'File' or 'Pipe', or `None` if the channel isn't configured.
+    """
+    try:
+        with open(input_config_path, 'r') as f:
+            return json.load(f)[channel_name].get('TrainingInputMode', 'File')
+    except (IOError, OSError, KeyError, ValueError):
+        return None
+
+
+def parse_batch(lines):
+    # Split a batch of CSV lines into the normalized features and the `rings` label
+    columns = tf.io.decode_csv(lines, record_defaults=[[0.0]] * len(COLUMN_NAMES))
+    features = tf.stack(columns[1:], axis=1)
+    # Same row-wise L2 normalization as `sklearn.preprocessing.normalize`
+    return tf.math.l2_normalize(features, axis=1), columns[0]
+
+
+def _finalize(lines, batch_size, shuffle_buffer):
+    if shuffle_buffer:
+        lines = lines.shuffle(shuffle_buffer, reshuffle_each_iteration=True)
+    # Batch first so decoding and normalization are vectorized over the whole batch
+    return lines.batch(batch_size) \
+                .map(parse_batch, num_parallel_calls=tf.data.experimental.AUTOTUNE) \
+                .prefetch(tf.data.experimental.AUTOTUNE)
+
+
+def file_dataset(files, batch_size, shuffle_buffer=0):
+    """
+    Description:
+    -----------
+    Streams CSV shards from disk, reading several shards in parallel.
+
+    :files: (list) Paths of the CSV shards.
+    :batch_size: (int) Number of rows per batch.
+    :shuffle_buffer: (int) Size of the shuffle buffer in rows, `0` to keep the file order.
+
+    :returns: (tf.data.Dataset) Batches of (features, label).
+    """
+    shuffle = shuffle_buffer > 0
+    files = tf.data.Dataset.from_tensor_slices(sorted(files))
+    if shuffle:
+        files = files.shuffle(len(files), reshuffle_each_iteration=True)
+    lines = files.interleave(
+        tf.data.TextLineDataset,
+        cycle_length=tf.data.experimental.AUTOTUNE,
+        num_parallel_calls=tf.data.experimental.AUTOTUNE,
+        deterministic=not shuffle
+    )
+    return _finalize(lines, batch_size, shuffle_buffer)
+
+
+def pipe_dataset(channel_path, batch_size, shuffle_buffer=0):
+    """
+    Description:
+    -----------
+    Streams CSV lines from a Sagemaker Pipe mode channel.
+
+    Sagemaker exposes epoch `n` of a Pipe mode channel as the FIFO `<channel path>_<n>`; Keras
+    iterates the dataset again every epoch, which opens the next FIFO. A local named pipe created
+    with `mkfifo` can stand in for Sagemaker.
+
+    :channel_path: (str) Channel path without the epoch suffix, e.g. `/opt/ml/input/data/training`.
+    :batch_size: (int) Number of rows per batch.
+    :shuffle_buffer: (int) Size of the shuffle buffer in rows, `0` to keep the stream order.
+
+    :returns: (tf.data.Dataset) Batches of (features, label).
+    """
+    epoch = [0]
+
+    def read_fifo():
+        path = '{}_{}'.format(channel_path, epoch[0])
+        epoch[0] += 1
+        with open(path, 'rb') as fifo:
+            for line in fifo:
+                if line.strip():
+                    yield line.rstrip(b'\r\n')
+
+    lines = tf.data.Dataset.from_generator(read_fifo, output_signature=tf.TensorSpec(shape=(), dtype=tf.string))
+    return _finalize(lines, batch_size, shuffle_buffer)
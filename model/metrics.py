@@ -0,0 +1,176 @@
+import bisect
+import glob
+import mmap
+import os
+import numpy as np
+
+# Histogram bucket upper bounds in seconds, log-spaced by a factor of sqrt(2) from 10us to ~2min
+BOUNDS = [1e-5 * 2 ** (i / 2.0) for i in range(48)]
+# Layout of a stage row: one slot per bucket, the `+Inf` bucket, then count, sum and max
+_INF = len(BOUNDS)
+_COUNT = _INF + 1
+_SUM = _INF + 2
+_MAX = _INF + 3
+_SLOTS = _INF + 4
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class StageHistograms(object):
+    """
+    Description:
+    -----------
+    Latency histograms shared across the gunicorn workers.
+
+    Every worker records into its own memory-mapped file under `directory`, so recording needs
+    neither locks nor IPC. Reading sums the files of all the workers.
+
+    :directory: (str) Directory holding one file per worker process.
+    :stages: (list) Names of the measured stages.
+    """
+    def __init__(self, directory, stages):
+        self.directory = directory
+        self.stages = list(stages)
+        self._index = dict((stage, i) for i, stage in enumerate(self.stages))
+        self._pid = None
+        self._data = None
+
+    def _array(self):
+        # Opened lazily, and again after a fork, so every process has its own file
+        if self._pid != os.getpid():
+            os.makedirs(self.directory, exist_ok=True)
+            size = len(self.stages) * _SLOTS * 8
+            path = os.path.join(self.directory, '{}.bin'.format(os.getpid()))
+            with open(path, 'wb') as f:
+                f.truncate(size)
+            with open(path, 'r+b') as f:
+                buffer = mmap.mmap(f.fileno(), size)
+            self._data = np.ndarray((len(self.stages), _SLOTS), dtype=np.float64, buffer=buffer)
+            self._pid = os.getpid()
+        return self._data
+
+    def observe(self, stage, seconds):
+        row = self._array()[self._index[stage]]
+        row[bisect.bisect_left(BOUNDS, seconds)] += 1
+        row[_COUNT] += 1
+        row[_SUM] += seconds
+        if seconds > row[_MAX]:
+            row[_MAX] = seconds
+
+    def aggregate(self):
+        """
+        Description:
+        -----------
+        Sums the histograms of every worker.
+
+        :returns: (NumPy Array) One row per stage, see the layout at the top of the module.
+        """
+        total = np.zeros((len(self.stages), _SLOTS), dtype=np.float64)
+        for path in glob.glob(os.path.join(self.directory, '*.bin')):
+            data = np.fromfile(path, dtype=np.float64)
+            if data.size != total.size:
+                continue
+            data = data.reshape(total.shape)
+            total[:, :_MAX] += data[:, :_MAX]
+            total[:, _MAX] = np.maximum(total[:, _MAX], data[:, _MAX])
+        return total
+
+    def render(self):
+        """
+        Description:
+        -----------
+        Renders the aggregated histograms, quantiles and maxima in Prometheus text format.
+
+        :returns: (str) Prometheus exposition text.
+        """
+        data = self.aggregate()
+        lines = [
+            '# HELP model_server_stage_seconds Latency of each stage of an inference request.',
+            '# TYPE model_server_stage_seconds histogram'
+        ]
+        for stage, row in zip(self.stages, data):
+            cumulative = np.cumsum(row[:_COUNT])
+            for bound, count in zip(BOUNDS, cumulative):
+                lines.append('model_server_stage_seconds_bucket{{stage="{}",le="{:.6g}"}} {:d}'.format(stage, bound, int(count)))
+            lines.append('model_server_stage_seconds_bucket{{stage="{}",le="+Inf"}} {:d}'.format(stage, int(cumulative[-1])))
+            lines.append('model_server_stage_seconds_sum{{stage="{}"}} {!r}'.format(stage, float(row[_SUM])))
+            lines.append('model_server_stage_seconds_count{{stage="{}"}} {:d}'.format(stage, int(row[_COUNT])))
+        lines += [
+            '# HELP model_server_stage_quantile_seconds Estimated latency quantiles of each stage.',
+            '# TYPE model_server_stage_quantile_seconds gauge'
+        ]
+        for stage, row in zip(self.stages, data):
+            for q in QUANTILES:
+                lines.append('model_server_stage_quantile_seconds{{stage="{}",quantile="{}"}} {!r}'.format(stage, q, quantile(row, q)))
+        lines += [
+            '# HELP model_server_stage_max_seconds Maximum latency of each stage.',
+            '# TYPE model_server_stage_max_seconds gauge'
+        ]
+        for stage, row in zip(self.stages, data):
+            lines.append('model_server_stage_max_seconds{{stage="{}"}} {!r}'.format(stage, float(row[_MAX])))
+        return '\n'.join(lines) + '\n'
+
+
+def quantile(row, q):
+    # Linear interpolation inside the bucket holding the q-th observation, capped by the maximum
+    count = row[_COUNT]
+    if count == 0:
+        return 0.0
+    cumulative = np.cumsum(row[:_COUNT])
+    i = int(np.searchsorted(cumulative, q * count))
+    if i >= _INF:
+        return float(row[_MAX])
+    lower = BOUNDS[i - 1] if i > 0 else 0.0
+    previous = cumulative[i - 1] if i > 0 else 0.0
+    fraction = (q * count - previous) / row[i] if row[i] else 1.0
+    return float(min(lower + (BOUNDS[i] - lower) * fraction, row[_MAX]))
+
+
+def render_gauges(samples):
+    """
+    Description:
+    -----------
+    Renders numeric values as Prometheus gauges.
+
+    Every metric family gets a single `# TYPE` line followed by one sample per label set, duplicate
+    `# TYPE` lines make the whole scrape invalid.
+
+    :samples: (list) Pairs of labels (dict) and values (dict of metric name, without the
+              `model_server_` prefix, to value).
+
+    :returns: (str) Prometheus exposition text.
+    """
+    families = {}
+    for labels, values in samples:
+        label_text = ','.join('{}="{}"'.format(k, v) for k, v in sorted(labels.items()))
+        for name, value in values.items():
+            if value is not None:
+                families.setdefault(name, []).append('model_server_{}{{{}}} {!r}'.format(name, label_text, float(value)))
+    lines = []
+    for name, family in sorted(families.items()):
+        lines.append('# TYPE model_server_{} gauge'.format(name))
+        lines.extend(family)
+    return '\n'.join(lines) + '\n'
+
+
+def process_memory():
+    """
+    Description:
+    -----------
+    Reads the resident memory of this process from `/proc/self/status`.
+
+    `rss_file_bytes` counts file-backed pages, like memory-mapped weights, which are shared with the
+    other workers mapping the same file; `rss_anon_bytes` is the memory private to this process.
+
+    :returns: (dict) Resident memory in bytes, empty when `/proc` is not available.
+    """
+    fields = {'VmRSS': 'rss_bytes', 'RssAnon': 'rss_anon_bytes', 'RssFile': 'rss_file_bytes', 'RssShmem': 'rss_shmem_bytes'}
+    memory = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in fields:
+                    memory[fields[key]] = int(value.split()[0]) * 1024
+    except (IOError, OSError):
+        pass
+    return memory
@@ -3,6 +3,8 @@ import sys
 import json
 import re
 import traceback
+import shutil
+import tempfile
 import tensorflow as tf
 import numpy as np
 import pandas as pd
@@ -12,6 +14,16 @@ from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Dense
 from tensorflow.keras.optimizers import Adam
 from sklearn import preprocessing
+import numpy_model
+import performance
+import profiling
+import quantization
+import checkpoint
+import dataset_cache
+import distributed
+import search
+import warm_start
+import input_pipeline
 
 tf.get_logger().setLevel('ERROR')
 
@@ -27,13 +39,132 @@ model_path = os.path.join(prefix, 'model')
 param_path = os.path.join(prefix, 'input/config/hyperparameters.json')
 
 
+def training_input_mode(params, channel_name):
+    """
+    Description:
+    -----------
+    Chooses how the training data is read.
+
+    'memory' loads `train.csv` and `validate.csv` with pandas, 'stream' reads every file of the channel
+    with `tf.data`, and 'pipe' reads Sagemaker Pipe mode FIFOs. The `input_mode` hyperparameter takes
+    precedence, otherwise a channel configured in Pipe mode selects 'pipe'.
+
+    :params: (dict) Hyperparameters.
+    :channel_name: (str) Name of the training channel.
+
+    :returns: (str) Input mode.
+    """
+    input_mode = params.get('input_mode')
+    if input_mode is None:
+        input_mode = 'pipe' if input_pipeline.channel_input_mode(channel_name) == 'Pipe' else 'memory'
+    if input_mode not in ['memory', 'stream', 'pipe']:
+        raise ValueError("Invalid input_mode '{}', must be 'memory', 'stream' or 'pipe'.".format(input_mode))
+    return input_mode
+
+def load_arrays(training_path, cache_dir=None):
+    """
+    Description:
+    -----------
+    Loads and normalizes `train.csv` and `validate.csv`.
+
+    The parsed arrays are cached in `cache_dir` under a hash of the CSV files, so later runs on the
+    same data memory-map them instead of parsing the text again.
+
+    :training_path: (str) Directory of the training channel.
+    :cache_dir: (str) Cache directory, `None` to disable the cache.
+
+    :returns: (tuple) train_X, train_y, val_X, val_y
+    """
+    names = ['train_X', 'train_y', 'val_X', 'val_y']
+    if cache_dir is not None:
+        files = [os.path.join(training_path, 'train.csv'), os.path.join(training_path, 'validate.csv')]
+        key = dataset_cache.content_hash(files, input_pipeline.COLUMN_NAMES, 'l2')
+        arrays = dataset_cache.load(cache_dir, key, names)
+        if arrays is not None:
+            print("Loaded parsed dataset from cache {}".format(key))
+            return arrays
+
+    # Load the training dataset
+    train_data = pd.read_csv(os.path.join(training_path, 'train.csv'), sep=',', names=input_pipeline.COLUMN_NAMES)
+    
+    # Load the validation dataset
+    val_data = pd.read_csv(os.path.join(training_path, 'validate.csv'), sep=',', names=input_pipeline.COLUMN_NAMES)
+
+    # Split the data for training features vs. predictor
+    train_y = train_data['rings'].to_numpy()
+    train_X = train_data.drop(['rings'], axis=1).to_numpy()
+    val_y = val_data['rings'].to_numpy()
+    val_X = val_data.drop(['rings'], axis=1).to_numpy()
+
+    # Normalize the data
+    train_X = preprocessing.normalize(train_X)
+    val_X = preprocessing.normalize(val_X)
+
+    if cache_dir is not None and dataset_cache.store(cache_dir, key, dict(zip(names, [train_X, train_y, val_X, val_y]))):
+        print("Cached parsed dataset as {}".format(key))
+    return train_X, train_y, val_X, val_y
+
+def make_datasets(input_mode, params, channel_name, input_files=None):
+    """
+    Description:
+    -----------
+    Builds the streaming training and validation datasets.
+
+    In 'stream' mode every file of the training channel is a training shard, except `validate.csv`
+    which is the validation set unless a separate 'validation' channel is provided. In 'pipe' mode the
+    validation set is read from the 'validation' channel when it is configured.
+
+    :input_mode: (str) 'stream' or 'pipe'.
+    :params: (dict) Hyperparameters, `batch_size` and `shuffle_buffer` are used.
+    :channel_name: (str) Name of the training channel.
+    :input_files: (list) Files of the training channel in 'stream' mode.
+
+    :returns: (tuple) Training dataset and validation dataset, or `None` without validation data.
+    """
+    batch_size = params.get('batch_size')
+    shuffle_buffer = int(params.get('shuffle_buffer', 10000))
+    validation_path = os.path.join(input_path, 'validation')
+    if input_mode == 'pipe':
+        train_data = input_pipeline.pipe_dataset(os.path.join(input_path, channel_name), batch_size, shuffle_buffer)
+        val_data = None
+        if input_pipeline.channel_input_mode('validation') == 'Pipe':
+            val_data = input_pipeline.pipe_dataset(validation_path, batch_size)
+        return train_data, val_data
+
+    if os.path.isdir(validation_path):
+        train_files = input_files
+        val_files = [os.path.join(validation_path, file) for file in os.listdir(validation_path) if not file.startswith('.')]
+    else:
+        train_files = [file for file in input_files if os.path.basename(file) != 'validate.csv']
+        val_files = [file for file in input_files if os.path.basename(file) == 'validate.csv']
+    print("Streaming {} training and {} validation files".format(len(train_files), len(val_files)))
+    train_data = input_pipeline.file_dataset(train_files, batch_size, shuffle_buffer)
+    val_data = input_pipeline.file_dataset(val_files, batch_size) if val_files else None
+    return train_data, val_data
+
+def build_model(params):
+    # Initialize weight tensors with a normal "Xavier" distribution
+    initializer = tf.keras.initializers.GlorotNormal()
+    dense_layers = []
+    # Build Deep layers
+    for layer in range(int(params.get('layers'))):
+        if layer == 0:
+            dense_layers.append(Dense(params.get('dense_layer'), kernel_initializer=initializer, input_dim=10))
+        else:
+            dense_layers.append(Dense(params.get('dense_layer'), activation='relu'))
+    # Add final linear `pass-through` layer
+    dense_layers.append(Dense(1, activation='linear'))
+    
+    # Build the model
+    return Sequential(dense_layers)
+
 # Define function called for training
 def train():
     print("Training mode ...")
     
     try:
-        # This algorithm has a single channel of input data called 'training'. Since we run in
-        # File mode, the input files are copied to the directory specified here.
+        # This algorithm has a single channel of input data called 'training'. In File mode the
+        # input files are copied to the directory specified here.
         channel_name = 'training'
         training_path = os.path.join(input_path, channel_name)
 
@@ -50,69 +181,158 @@ def train():
                     value = int(value)
                 params[key] = value
 
-        # Confirm that training files exists and the channel was correctly configured
-        input_files = [ os.path.join(training_path, file) for file in os.listdir(training_path) ]
-        if len(input_files) == 0:
-            raise ValueError(('There are no files in {}.\\n' +
-                              'This usually indicates that the channel ({}) was incorrectly specified,\\n' +
-                              'the data specification in S3 was incorrectly specified or the role specified\\n' +
-                              'does not have permission to access the data.').format(training_path, channel_name))
-        
-        # Specify the Column names in order to manipulate the specific columns for pre-processing
-        column_names = ["rings", "length", "diameter", "height", "whole weight", 
-                "shucked weight", "viscera weight", "shell weight", "sex_F", "sex_I", "sex_M"]
-        
-        # Load the training dataset
-        train_data = pd.read_csv(os.path.join(training_path, 'train.csv'), sep=',', names=column_names)
-        
-        # Load the validation dataset
-        val_data = pd.read_csv(os.path.join(training_path, 'validate.csv'), sep=',', names=column_names)
-
-        # Split the data for training features vs. predictor
-        train_y = train_data['rings'].to_numpy()
-        train_X = train_data.drop(['rings'], axis=1).to_numpy()
-        val_y = val_data['rings'].to_numpy()
-        val_X = val_data.drop(['rings'], axis=1).to_numpy()
-
-        # Normalize the data
-        train_X = preprocessing.normalize(train_X)
-        val_X = preprocessing.normalize(val_X)
+        # Data-parallel across the hosts of the training job, must be set up before any other TensorFlow operation
+        cluster = distributed.Cluster(distributed.cluster_spec())
+        print("Worker {} of {}".format(cluster.index + 1, cluster.workers))
+        # Every worker trains on `batch_size` observations per step
+        global_batch_size = params.get('batch_size') * cluster.workers
+
+        # File mode copies the input files to `training_path`, Pipe mode streams them through FIFOs
+        input_mode = training_input_mode(params, channel_name)
+        print("Input Mode: %s" % input_mode)
+
+        if input_mode != 'pipe':
+            # Confirm that training files exists and the channel was correctly configured
+            # Hidden entries, e.g. the parsed dataset cache, aren't input data
+            input_files = [ os.path.join(training_path, file) for file in os.listdir(training_path) if not file.startswith('.') ]
+            if len(input_files) == 0:
+                raise ValueError(('There are no files in {}.\\n' +
+                                  'This usually indicates that the channel ({}) was incorrectly specified,\\n' +
+                                  'the data specification in S3 was incorrectly specified or the role specified\\n' +
+                                  'does not have permission to access the data.').format(training_path, channel_name))
+
+        # Observations used to check the exported serving models against Keras
+        sample_X = None
+        if input_mode == 'memory':
+            # Set the `dataset_cache` hyperparameter to 'off' to always parse the CSV files
+            cache_dir = None
+            if params.get('dataset_cache', 'on') != 'off':
+                cache_dir = params.get('dataset_cache_dir', os.path.join(training_path, '.cache'))
+            train_X, train_y, val_X, val_y = load_arrays(training_path, cache_dir)
+            sample_X = val_X
+            if cluster.distributed:
+                # The same seed on every worker, so the shards of a shuffled epoch don't overlap
+                train_data = tf.data.Dataset.from_tensor_slices((train_X, train_y)).shuffle(len(train_X), seed=0).batch(global_batch_size)
+                val_data = tf.data.Dataset.from_tensor_slices((val_X, val_y)).batch(global_batch_size)
+                fit_data = dict(x=cluster.shard(train_data), validation_data=cluster.shard(val_data))
+            else:
+                fit_data = dict(
+                    x=train_X,
+                    y=train_y,
+                    validation_data=(val_X, val_y),
+                    batch_size=params.get('batch_size'),
+                    shuffle=True
+                )
+        else:
+            train_data, val_data = make_datasets(input_mode, dict(params, batch_size=global_batch_size), channel_name, input_files if input_mode == 'stream' else None)
+            fit_data = dict(x=cluster.shard(train_data), validation_data=cluster.shard(val_data))
         
         # Prevent overtraining to minimize model overfitting the data
-        early_stop = keras.callbacks.EarlyStopping(monitor='val_loss', patience=10)
+        early_stop = keras.callbacks.EarlyStopping(monitor='val_loss' if fit_data['validation_data'] is not None else 'loss', patience=10)
         
         # Build the DNN layers
         algorithm = 'TensorflowRegression'
         print("Training Algorithm: %s" % algorithm)
-        # Initialize weight tensors with a normal "Xavier" distribution
-        initializer = tf.keras.initializers.GlorotNormal()
-        dense_layers = []
-        # Build Deep layers
-        for layer in range(int(params.get('layers'))):
-            if layer == 0:
-                dense_layers.append(Dense(params.get('dense_layer'), kernel_initializer=initializer, input_dim=10))
-            else:
-                dense_layers.append(Dense(params.get('dense_layer'), activation='relu'))
-        # Add final linear `pass-through` layer
-        dense_layers.append(Dense(1, activation='linear'))
-        
-        # Build the model
-        model = Sequential(dense_layers)
-        model.summary()
-        
-        # Compile and train the model
-        model.compile(loss='mse', optimizer='adam', metrics=['mae','accuracy'])
-        model.fit(
-            train_X,
-            train_y,
-            validation_data=(val_X, val_y),
-            batch_size=params.get('batch_size'),
-            epochs=params.get('epochs'),
-            shuffle=True,
-            verbose=1,
-            callbacks=[early_stop]
-        )
+        # The previous model, when provided through the optional 'model' channel, is fine-tuned instead
+        warm_start_dir = tempfile.mkdtemp(prefix='warm-start-')
+        previous_model = None
+        if params.get('warm_start', 'on') != 'off':
+            previous_model = warm_start.find_model(os.path.join(input_path, 'model'), warm_start_dir)
+        # Comma separated `layers`, `dense_layer` or `batch_size` values are searched
+        if len(search.candidates(params)) > 1:
+            if input_mode != 'memory' or cluster.distributed:
+                raise ValueError("Hyperparameter search requires input_mode 'memory' and a single training instance")
+            work_dir = tempfile.mkdtemp(prefix='search-')
+            try:
+                best, leaderboard = search.search(
+                    build_model,
+                    params,
+                    (train_X, train_y, val_X, val_y),
+                    work_dir,
+                    processes=params.get('search_processes'),
+                    eta=int(params.get('search_eta', 3)),
+                    min_epochs=params.get('search_min_epochs')
+                )
+                search.write_leaderboard(leaderboard, os.path.join(model_path, 'leaderboard.json'))
+                print("Best Hyperparameters: {}".format(leaderboard[0]['hyperparameters']))
+                model = keras.models.load_model(best)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            model.summary()
+        elif previous_model is not None:
+            if input_mode != 'memory' or cluster.distributed:
+                raise ValueError("Warm start requires input_mode 'memory' and a single training instance")
+            print("Warm starting from %s" % previous_model)
+            model = warm_start.train(previous_model, build_model, params, (train_X, train_y, val_X, val_y), model_path)
+            model.summary()
+        else:
+            callbacks = [early_stop]
+            initial_epoch = 0
+            # Variables created in the scope are mirrored on every worker
+            with cluster.strategy.scope():
+                model = build_model(params)
+                model.summary()
+                
+                # Compile and train the model, the `performance_mode` hyperparameter enables XLA
+                # Epoch metrics run first, so the other callbacks see them in the epoch logs
+                # Every iteration of a Pipe mode dataset opens the next FIFO, only Keras may read it
+                callbacks[:0] = performance.compile_model(model, params, fit_data['validation_data'] if input_mode != 'pipe' else None)
+                # Set the `checkpoint` hyperparameter to 'off' to always train from scratch
+                if params.get('checkpoint', 'on') != 'off':
+                    # Every worker resumes from the same checkpoint, only the chief writes new ones
+                    checkpoint_dir = params.get('checkpoint_dir', checkpoint.default_checkpoint_dir)
+                    if input_mode != 'pipe':
+                        validation_path = os.path.join(input_path, 'validation')
+                        validation_files = [os.path.join(validation_path, file) for file in os.listdir(validation_path) if not file.startswith('.')] if os.path.isdir(validation_path) else []
+                        run = checkpoint.fingerprint(params, input_files + validation_files, cluster.workers)
+                    else:
+                        # The FIFOs can't be hashed, only a restart of the same training job resumes
+                        run = checkpoint.fingerprint(params, [], cluster.workers, os.environ.get('TRAINING_JOB_NAME'))
+                    initial_epoch = checkpoint.restore(model, checkpoint_dir, run, params.get('epochs'))
+                    if cluster.is_chief:
+                        callbacks.append(checkpoint.CheckpointCallback(
+                            checkpoint_dir,
+                            run,
+                            every=params.get('checkpoint_every', 10),
+                            keep=params.get('checkpoint_keep', 3)
+                        ))
+            # Set the `profile` hyperparameter to 'on' to ship a timing report and trace with the model
+            if params.get('profile', 'off') == 'on' and cluster.is_chief:
+                # Steps "<start>,<end>" to trace, or 'off' for the timing report only
+                trace_start, trace_end = profiling.trace_steps(params.get('profile_steps', '10,20'))
+                callbacks.append(profiling.ProfilingCallback(
+                    os.path.join(model_path, 'profile'),
+                    params.get('batch_size'),
+                    samples=len(train_X) // cluster.workers if input_mode == 'memory' else None,
+                    trace_start=trace_start,
+                    trace_end=trace_end
+                ))
+            model.fit(
+                epochs=params.get('epochs'),
+                initial_epoch=initial_epoch,
+                verbose=1,
+                callbacks=callbacks,
+                **fit_data
+            )
         
+        shutil.rmtree(warm_start_dir, ignore_errors=True)
+
+        if cluster.distributed:
+            # Predicting with the distributed model runs collective ops, which would wait for the
+            # workers that already exited; the exports use a local copy of the trained weights
+            trained = model
+            model = build_model(params)
+            model.set_weights(trained.get_weights())
+            model.compile(loss='mse', optimizer='adam')
+
+        if not cluster.is_chief:
+            # Workers hold the same weights as the chief, their copy is discarded
+            work_dir = tempfile.mkdtemp(prefix='worker-')
+            model.save(os.path.join(work_dir, 'model.h5'), include_optimizer=False, save_format="h5")
+            shutil.rmtree(work_dir, ignore_errors=True)
+            print("Worker {} completed training".format(cluster.index + 1))
+            return
+
         # Save the model as a single 'h5' file without the optimizer
         print("Saving Model ...")
         model.save(
@@ -121,6 +341,25 @@ def train():
             include_optimizer=False,
             save_format="h5"
         )
+        if input_mode == 'memory':
+            # The next warm start fine-tunes only on rows that aren't in this set
+            warm_start.write_row_hashes(train_X, train_y, model_path)
+
+        # Export the weights for the TensorFlow-free serving backend and check it agrees with Keras
+        print("Exporting NumPy Model ...")
+        numpy_model_path = os.path.join(model_path, 'model.npz')
+        numpy_model.export(model, numpy_model_path)
+        if sample_X is None:
+            # Streamed data is not kept in memory, compare on random normalized observations instead
+            sample_X = preprocessing.normalize(np.random.rand(256, 10))
+        max_diff = numpy_model.verify(model, numpy_model.NumpyModel.load(numpy_model_path), sample_X)
+        print("NumPy Model maximum difference from Keras: {}".format(max_diff))
+        # Same weights as a single uncompressed file that the serving workers memory-map and share
+        numpy_model.export_mapped(numpy_model.NumpyModel.load(numpy_model_path), os.path.join(model_path, 'model.weights'))
+
+        # Reduced-precision variants, scored against the float model by `evaluation.py`
+        print("Exporting Quantized Models ...")
+        quantization.export(model, model_path)
 
     except Exception as e:
         # Write out an error file. This will be returned as the failureReason in the
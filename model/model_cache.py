@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def model_bytes(model):
+    # Memory held by the weights, `NumpyModel` reports it directly, Keras models through `get_weights()`
+    if hasattr(model, 'nbytes'):
+        return model.nbytes
+    return sum(w.nbytes for w in model.get_weights())
+
+
+class _Entry(object):
+    def __init__(self):
+        self.model = None
+        self.bytes = 0
+        self.loads = 0
+        self.load_seconds = 0.0
+        self.hits = 0
+        self.evictions = 0
+
+
+class ModelCache(object):
+    """
+    Description:
+    -----------
+    Loads named models on demand and keeps the most recently used ones within a memory budget.
+
+    Concurrent requests for a model that is being loaded wait for that single load, while requests
+    for models already in memory are served straight away. The least recently used models are
+    evicted when the total weight size goes over `max_bytes`; the model just loaded is always kept.
+
+    :loader: (callable) Function loading and warming up the model with the given name.
+    :max_bytes: (int) Memory budget for the weights of all the cached models.
+    :run_blocking: (callable) Runs `loader` off the event loop, e.g. `InferencePool.run`.
+    """
+    def __init__(self, loader, max_bytes, run_blocking=None):
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.run_blocking = run_blocking or (lambda fn, *args: fn(*args))
+        self.bytes = 0
+        self._models = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+        # Statistics of every model ever requested, including evicted ones
+        self._stats = {}
+
+    def get(self, name):
+        while True:
+            with self._lock:
+                stats = self._stats.setdefault(name, _Entry())
+                if name in self._models:
+                    self._models.move_to_end(name)
+                    stats.hits += 1
+                    return self._models[name].model
+                loading = self._loading.get(name)
+                if loading is None:
+                    loading = self._loading[name] = threading.Event()
+                    break
+            # Another request is loading this model, wait for it and look it up again
+            loading.wait()
+
+        try:
+            start = time.time()
+            model = self.run_blocking(self.loader, name)
+            size = model_bytes(model)
+            with self._lock:
+                stats.model = model
+                stats.bytes = size
+                stats.loads += 1
+                stats.load_seconds += time.time() - start
+                self._models[name] = stats
+                self.bytes += size
+                while self.bytes > self.max_bytes and len(self._models) > 1:
+                    _, evicted = self._models.popitem(last=False)
+                    self.bytes -= evicted.bytes
+                    evicted.model = None
+                    evicted.evictions += 1
+            return model
+        finally:
+            with self._lock:
+                del self._loading[name]
+            loading.set()
+
+    def stats(self):
+        """
+        Description:
+        -----------
+        Returns the statistics of every requested model.
+
+        :returns: (dict) Model name to its loads, total load time, hits, evictions, weight size and
+                  whether it is currently in memory.
+        """
+        with self._lock:
+            return dict((name, {
+                'loaded': 1 if name in self._models else 0,
+                'bytes': entry.bytes,
+                'loads': entry.loads,
+                'load_seconds': entry.load_seconds,
+                'hits': entry.hits,
+                'evictions': entry.evictions
+            }) for name, entry in self._stats.items())
@@ -0,0 +1,67 @@
+import os
+import random
+
+try:
+    # The watcher must run in a real OS thread, loading a model would otherwise block the gevent loop
+    from gevent.monkey import get_original
+    start_new_thread = get_original('_thread', 'start_new_thread')
+    sleep = get_original('time', 'sleep')
+except ImportError:
+    from _thread import start_new_thread
+    from time import sleep
+
+
+def signature(path):
+    # Modification time and size identify a version of the model file, `None` while it is missing
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class ModelWatcher(object):
+    """
+    Description:
+    -----------
+    Polls a model file and calls `on_change` from a background thread when a new version appears.
+
+    A change is only reported once the file signature is the same on two consecutive polls, so a
+    model that is still being copied is never loaded. The first poll is delayed by a random
+    fraction of the interval so the workers don't all reload at the same moment.
+
+    :path: (str) Model file to watch.
+    :current: (tuple) Signature of the currently loaded version, see `signature()`.
+    :interval: (float) Seconds between two polls.
+    :on_change: (callable) Called without arguments when a new version is ready to load.
+    """
+    def __init__(self, path, current, interval, on_change):
+        self.path = path
+        self.current = current
+        self.interval = interval
+        self.on_change = on_change
+        self.reloads = 0
+        self.failures = 0
+
+    def start(self):
+        start_new_thread(self._run, ())
+
+    def _run(self):
+        sleep(random.uniform(0, self.interval))
+        candidate = None
+        while True:
+            latest = signature(self.path)
+            if latest is not None and latest != self.current:
+                if latest == candidate:
+                    try:
+                        self.on_change()
+                        self.reloads += 1
+                    except Exception as e:
+                        self.failures += 1
+                        print('Model reload failed, keeping the current model: {}'.format(e))
+                    self.current = latest
+                    candidate = None
+                else:
+                    # Wait one more poll to make sure the file is complete
+                    candidate = latest
+            sleep(self.interval)
@@ -0,0 +1,169 @@
+import json
+import mmap
+import os
+import numpy as np
+
+# Alignment of every array in a mapped weights file
+ALIGNMENT = 64
+
+# Activations supported by the NumPy forward pass, applied in place on the layer output
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0, out=x),
+    'tanh': lambda x: np.tanh(x, out=x),
+    'sigmoid': lambda x: np.divide(1.0, 1.0 + np.exp(-x, out=x), out=x)
+}
+
+
+class NumpyModel(object):
+    """
+    Description:
+    -----------
+    Forward pass of a stack of `Dense` layers using NumPy only.
+
+    :kernels: (list) Kernel matrix of every layer, shaped (inputs, units).
+    :biases: (list) Bias vector of every layer, shaped (units,).
+    :activations: (list) Activation name of every layer, see `ACTIVATIONS`.
+    """
+    def __init__(self, kernels, biases, activations):
+        for activation in activations:
+            if activation not in ACTIVATIONS:
+                raise ValueError("Unsupported activation '{}'".format(activation))
+        self.kernels = kernels
+        self.biases = biases
+        self.activations = activations
+        self.dtype = kernels[0].dtype
+
+    @property
+    def input_shape(self):
+        # Same convention as `keras.Model.input_shape`
+        return (None, self.kernels[0].shape[0])
+
+    @property
+    def nbytes(self):
+        return sum(kernel.nbytes + bias.nbytes for kernel, bias in zip(self.kernels, self.biases))
+
+    def predict(self, input):
+        x = np.asarray(input, dtype=self.dtype)
+        for kernel, bias, activation in zip(self.kernels, self.biases, self.activations):
+            x = ACTIVATIONS[activation](np.matmul(x, kernel) + bias)
+        return x
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as weights:
+            activations = [str(a) for a in weights['activations']]
+            kernels = [weights['kernel_{}'.format(i)] for i in range(len(activations))]
+            biases = [weights['bias_{}'.format(i)] for i in range(len(activations))]
+        return cls(kernels, biases, activations)
+
+    @classmethod
+    def load_mapped(cls, path):
+        """
+        Description:
+        -----------
+        Memory-maps a weights file written by `export_mapped()`.
+
+        The arrays are read-only views over a shared mapping of the file, so every worker process
+        serving the same file uses the same physical pages from the page cache.
+
+        :path: (str) Weights file path.
+        """
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header_size = int.from_bytes(buffer[:8], 'little')
+        header = json.loads(buffer[8:8 + header_size].decode('utf-8'))
+        arrays = {}
+        for array in header['arrays']:
+            dtype = np.dtype(array['dtype'])
+            count = int(np.prod(array['shape']))
+            arrays[array['name']] = np.frombuffer(buffer, dtype=dtype, count=count, offset=array['offset']).reshape(array['shape'])
+        activations = header['activations']
+        kernels = [arrays['kernel_{}'.format(i)] for i in range(len(activations))]
+        biases = [arrays['bias_{}'.format(i)] for i in range(len(activations))]
+        return cls(kernels, biases, activations)
+
+
+def export(keras_model, path):
+    """
+    Description:
+    -----------
+    Writes the weights of a `Sequential` model made of `Dense` layers to a compressed `.npz` file.
+
+    :keras_model: (keras.Model) Trained model.
+    :path: (str) Output file path.
+    """
+    weights = {}
+    activations = []
+    for i, layer in enumerate(keras_model.layers):
+        config = layer.get_config()
+        if 'units' not in config or not config.get('use_bias', True):
+            raise ValueError("Layer '{}' can't be exported, only `Dense` layers with bias are supported".format(layer.name))
+        kernel, bias = layer.get_weights()
+        weights['kernel_{}'.format(i)] = kernel
+        weights['bias_{}'.format(i)] = bias
+        activations.append(config['activation'])
+    weights['activations'] = np.array(activations)
+    with open(path, 'wb') as f:
+        np.savez_compressed(f, **weights)
+
+
+def export_mapped(numpy_model, path):
+    """
+    Description:
+    -----------
+    Writes the weights to a single uncompressed file that `NumpyModel.load_mapped()` can map.
+
+    Layout: the size of a JSON header as 8 little-endian bytes, the header describing every array,
+    then the raw arrays, each aligned on `ALIGNMENT` bytes. The file is written under a temporary
+    name and renamed, so processes mapping the previous version are never affected.
+
+    :numpy_model: (NumpyModel) Model to write.
+    :path: (str) Output file path.
+    """
+    arrays = []
+    for i, (kernel, bias) in enumerate(zip(numpy_model.kernels, numpy_model.biases)):
+        arrays.append(('kernel_{}'.format(i), np.ascontiguousarray(kernel)))
+        arrays.append(('bias_{}'.format(i), np.ascontiguousarray(bias)))
+
+    def align(offset):
+        return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+    # The header size depends on the offsets it stores, reserve room for it first
+    header = {'activations': numpy_model.activations, 'arrays': []}
+    for name, array in arrays:
+        header['arrays'].append({'name': name, 'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': 0})
+    offset = align(8 + len(json.dumps(header)) + 32 * len(arrays))
+    for entry, (name, array) in zip(header['arrays'], arrays):
+        entry['offset'] = offset
+        offset = align(offset + array.nbytes)
+    header_bytes = json.dumps(header).encode('utf-8')
+
+    with open(path + '.tmp', 'wb') as f:
+        f.write(len(header_bytes).to_bytes(8, 'little'))
+        f.write(header_bytes)
+        for entry, (name, array) in zip(header['arrays'], arrays):
+            f.write(b'\0' * (entry['offset'] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(path + '.tmp', path)
+
+
+def verify(keras_model, numpy_model, input, rtol=1e-4, atol=1e-4):
+    """
+    Description:
+    -----------
+    Checks that the NumPy forward pass matches the Keras model output.
+
+    :keras_model: (keras.Model) Reference model.
+    :numpy_model: (NumpyModel) Exported model.
+    :input: (NumPy Array) Sample observations to compare on.
+    :rtol: (float) Relative tolerance.
+    :atol: (float) Absolute tolerance.
+
+    :returns: (float) Maximum absolute difference between both outputs.
+    """
+    expected = keras_model.predict(input)
+    actual = numpy_model.predict(input)
+    if not np.allclose(actual, expected, rtol=rtol, atol=atol):
+        raise ValueError("NumPy model output differs from Keras by up to {}".format(np.max(np.abs(actual - expected))))
+    return float(np.max(np.abs(actual - expected)))
@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from gevent import monkey
+    from gevent.threadpool import ThreadPool as GeventThreadPool
+except ImportError:
+    monkey = None
+
+
+class InferencePool(object):
+    """
+    Description:
+    -----------
+    Runs blocking calls, like a model forward pass, in a pool of native threads.
+
+    Under gunicorn's gevent worker only the calling greenlet waits for the result, so the event loop
+    keeps serving `/ping` and parsing other requests while the model runs.
+
+    :size: (int) Number of native threads.
+    """
+    def __init__(self, size):
+        self.size = size
+        if monkey is not None and monkey.is_module_patched('threading'):
+            self._pool = GeventThreadPool(size)
+            self._apply = lambda fn, args: self._pool.apply(fn, args)
+        else:
+            self._pool = ThreadPoolExecutor(size)
+            self._apply = lambda fn, args: self._pool.submit(fn, *args).result()
+        # Counters, only updated from the calling side
+        self.submitted = 0
+        self.completed = 0
+
+    def run(self, fn, *args):
+        self.submitted += 1
+        try:
+            return self._apply(fn, args)
+        finally:
+            self.completed += 1
+
+    def stats(self):
+        pending = self.submitted - self.completed
+        running = min(pending, self.size)
+        return {
+            'threads': self.size,
+            'running': running,
+            'queue_depth': pending - running,
+            'completed': self.completed
+        }
@@ -0,0 +1,128 @@
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+# Metrics of the baseline `compile()`
+default_metrics = ['mae', 'accuracy']
+
+
+def _metric_names(value):
+    # Comma separated metric names, 'none' for no metric
+    if value is None:
+        return []
+    return [name.strip() for name in str(value).split(',') if name.strip() and name.strip() != 'none']
+
+
+def _epoch_metrics(params, validation_data):
+    # Callbacks computing the `epoch_metrics`, none if the validation data can't be read again
+    epoch_metrics = _metric_names(params.get('epoch_metrics', 'mae'))
+    if epoch_metrics and validation_data is None:
+        print("The epoch metrics {} are skipped, the validation data can only be read once per epoch".format(epoch_metrics))
+    return [EpochMetrics(epoch_metrics, validation_data)] if epoch_metrics and validation_data is not None else []
+
+
+def learning_rate(params):
+    """
+    Description:
+    -----------
+    Learning rate scaled with the batch size.
+
+    Larger batches take fewer, less noisy steps per epoch; scaling the learning rate with the batch
+    size keeps the progress per epoch comparable. 'linear' multiplies it by
+    `batch_size / base_batch_size`, 'sqrt' by the square root of that ratio.
+
+    :params: (dict) Hyperparameters, `learning_rate`, `base_batch_size` and `lr_scaling` are used.
+
+    :returns: (float) Learning rate.
+    """
+    rate = float(params.get('learning_rate', 0.001))
+    ratio = float(params.get('batch_size')) / float(params.get('base_batch_size', params.get('batch_size')))
+    scaling = params.get('lr_scaling', 'none')
+    if scaling == 'linear':
+        return rate * ratio
+    if scaling == 'sqrt':
+        return rate * np.sqrt(ratio)
+    if scaling != 'none':
+        raise ValueError("Invalid lr_scaling '{}', must be 'linear', 'sqrt' or 'none'.".format(scaling))
+    return rate
+
+
+def compile_model(model, params, validation_data=None):
+    """
+    Description:
+    -----------
+    Compiles the model for fast CPU training when the `performance_mode` hyperparameter is 'on'.
+
+    The train step is compiled with XLA, `steps_per_execution` steps run per call of the compiled
+    function, and only the `step_metrics` are computed every step. Otherwise the model is compiled
+    as before.
+
+    `compile(jit_compile=True)` only exists from Keras 2.8, the 2.7 image would silently ignore it,
+    so the train step itself is wrapped in an XLA `tf.function` the same way later Keras releases do.
+    Under a distribution strategy, e.g. multi-worker training, the wrap is skipped: the gradient
+    all-reduce can't run inside the nested function.
+
+    :model: (keras.Model) Model to compile.
+    :params: (dict) Hyperparameters.
+    :validation_data: (tuple) Validation arrays (X, y) or `tf.data.Dataset` the epoch metrics use,
+                      `None` if it can't be read a second time every epoch, e.g. a Pipe mode FIFO.
+
+    :returns: (list) Callbacks computing the `epoch_metrics` at the end of every epoch.
+    """
+    if params.get('performance_mode', 'off') != 'on':
+        model.compile(loss='mse', optimizer='adam', metrics=default_metrics)
+        return []
+
+    options = dict(
+        loss='mse',
+        optimizer=keras.optimizers.Adam(learning_rate=learning_rate(params)),
+        metrics=_metric_names(params.get('step_metrics', 'none')),
+        steps_per_execution=int(params.get('steps_per_execution', 1))
+    )
+    model.compile(**options)
+    if tf.distribute.has_strategy():
+        # The gradient all-reduce can't run inside a nested `tf.function`, the other options still apply
+        print("XLA is skipped under the {}, the train step is compiled without it".format(type(tf.distribute.get_strategy()).__name__))
+        return _epoch_metrics(params, validation_data)
+    try:
+        # Keras calls `model.train_step` inside its own `tf.function`, the nested function is compiled by XLA
+        model.train_step = tf.function(model.train_step, jit_compile=True, experimental_relax_shapes=True)
+    except TypeError:
+        raise ValueError("performance_mode requires XLA, TensorFlow {} doesn't support `tf.function(jit_compile=True)`".format(tf.__version__))
+    return _epoch_metrics(params, validation_data)
+
+
+class EpochMetrics(keras.callbacks.Callback):
+    """
+    Description:
+    -----------
+    Computes metrics on the validation data once per epoch instead of at every training step.
+
+    The values are added to the epoch logs as `val_<metric>`, so `EarlyStopping`, `History` and
+    the progress bar see them like compiled metrics.
+
+    :metrics: (list) Keras metric names, e.g. 'mae'.
+    :validation_data: (tuple) Validation arrays (X, y) or `tf.data.Dataset` of batches.
+    """
+    def __init__(self, metrics, validation_data):
+        super(EpochMetrics, self).__init__()
+        self.metrics = [keras.metrics.get(name) for name in metrics]
+        self.names = metrics
+        self.validation_data = validation_data
+
+    def on_epoch_end(self, epoch, logs=None):
+        if logs is None:
+            return
+        if isinstance(self.validation_data, tf.data.Dataset):
+            predictions, labels = [], []
+            for x, y in self.validation_data:
+                predictions.append(self.model(x, training=False))
+                labels.append(y)
+            predictions = tf.concat(predictions, axis=0)
+            labels = tf.concat(labels, axis=0)
+        else:
+            x, labels = self.validation_data
+            predictions = self.model.predict(x, batch_size=4096, verbose=0)
+        labels = tf.reshape(tf.cast(labels, predictions.dtype), tf.shape(predictions))
+        for name, metric in zip(self.names, self.metrics):
+            logs['val_{}'.format(name)] = float(tf.reduce_mean(metric(labels, predictions)))
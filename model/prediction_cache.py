@@ -0,0 +1,104 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+class PredictionCache(object):
+    """
+    Description:
+    -----------
+    Bounded LRU cache of predictions keyed on a hash of the normalized feature array.
+
+    Entries are tagged with the model generation they were computed with; a lookup with a newer
+    generation (i.e. after the model was reloaded) drops every cached prediction.
+
+    :max_entries: (int) Maximum number of cached requests.
+    :max_bytes: (int) Maximum size of the cached predictions and keys, `0` for no limit.
+    :ttl: (float) Seconds before an entry expires, `0` for no expiry.
+    """
+    def __init__(self, max_entries, max_bytes=0, ttl=0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.generation = None
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(data, model_name=None):
+        # The same observations hash to the same key whatever the request format or dtype was
+        data = np.ascontiguousarray(data, dtype=np.float64)
+        digest = hashlib.blake2b('{}{}'.format(model_name or '', data.shape).encode('utf-8'), digest_size=16)
+        digest.update(data)
+        return digest.digest()
+
+    def get(self, key, generation):
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, result = entry
+            if expires is not None and expires < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result, generation):
+        result = np.array(result)
+        result.setflags(write=False)
+        size = result.nbytes + len(key)
+        if self.max_bytes and size > self.max_bytes:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if generation != self.generation:
+                # Computed with a model that has since been replaced
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires, result)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or (self.max_bytes and self.bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        # Caller must hold `self._lock`
+        _, result = self._entries.pop(key)
+        self.bytes -= result.nbytes + len(key)
+
+    def _check_generation(self, generation):
+        # Caller must hold `self._lock`
+        if generation != self.generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.bytes = 0
+            self.generation = generation
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
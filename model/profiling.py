@@ -0,0 +1,144 @@
+import json
+import os
+import time
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+
+def trace_steps(value):
+    """
+    Description:
+    -----------
+    Parses the `profile_steps` hyperparameter.
+
+    :value: (str) Steps "<start>,<end>" to trace, or 'off' for the timing report only.
+
+    :returns: (tuple) First and last traced step, `(None, None)` when tracing is off.
+    """
+    if str(value) == 'off':
+        return None, None
+    steps = str(value).split(',')
+    try:
+        start, end = [int(step) for step in steps]
+    except ValueError:
+        raise ValueError("Invalid profile_steps '{}', must be \"<start>,<end>\", e.g. \"10,20\", or 'off'.".format(value))
+    if not 0 <= start < end:
+        raise ValueError("Invalid profile_steps '{}', the steps must be 0 or more and the start below the end.".format(value))
+    return start, end
+
+
+class ProfilingCallback(keras.callbacks.Callback):
+    """
+    Description:
+    -----------
+    Records where the time of every epoch goes and traces a window of training steps.
+
+    Every epoch is split between the training steps, the validation pass and the remaining overhead
+    (callbacks, logging and Python between steps), with step time percentiles and the throughput.
+    Steps `trace_start` to `trace_end` (counted across epochs) are captured with the TensorFlow
+    profiler, which TensorBoard can open from `<directory>/trace`. The report is written to
+    `<directory>/profile.json` when training ends.
+
+    Timing every step synchronizes Keras after each batch, so it is only enabled on request.
+
+    :directory: (str) Output directory, created if needed.
+    :batch_size: (int) Observations per step, used for the throughput.
+    :samples: (int) Observations per epoch if known, the last step is usually partial.
+    :trace_start: (int) First traced step, `None` to disable the trace.
+    :trace_end: (int) Step after the last traced step.
+    """
+    def __init__(self, directory, batch_size, samples=None, trace_start=None, trace_end=None):
+        super(ProfilingCallback, self).__init__()
+        self.directory = directory
+        self.batch_size = batch_size
+        self.samples = samples
+        self.trace_start = trace_start
+        self.trace_end = trace_end
+        self.epochs = []
+        self._step = 0
+        self._tracing = False
+        os.makedirs(directory, exist_ok=True)
+
+    def on_train_begin(self, logs=None):
+        self._train_start = time.perf_counter()
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_start = time.perf_counter()
+        self._step_times = []
+        self._validation = 0.0
+
+    def on_train_batch_begin(self, batch, logs=None):
+        if self.trace_start is not None and self._step == self.trace_start:
+            tf.profiler.experimental.start(os.path.join(self.directory, 'trace'))
+            self._tracing = True
+        self._step_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._step_times.append(time.perf_counter() - self._step_start)
+        self._step += 1
+        if self._tracing and self._step >= self.trace_end:
+            self._stop_trace()
+
+    def on_test_begin(self, logs=None):
+        self._validation_start = time.perf_counter()
+
+    def on_test_end(self, logs=None):
+        self._validation += time.perf_counter() - self._validation_start
+
+    def on_epoch_end(self, epoch, logs=None):
+        seconds = time.perf_counter() - self._epoch_start
+        step_times = np.array(self._step_times)
+        steps = len(step_times)
+        training = float(step_times.sum())
+        samples = self.samples or steps * self.batch_size
+        p50, p90, p99 = np.percentile(step_times, [50, 90, 99]) * 1000 if steps else (0.0, 0.0, 0.0)
+        self.epochs.append({
+            'epoch': epoch + 1,
+            'seconds': seconds,
+            'training_seconds': training,
+            'validation_seconds': self._validation,
+            'overhead_seconds': max(0.0, seconds - training - self._validation),
+            'steps': steps,
+            'samples_per_second': samples / training if training > 0 else 0.0,
+            'step_ms': {
+                'p50': float(p50),
+                'p90': float(p90),
+                'p99': float(p99),
+                'max': float(step_times.max() * 1000) if steps else 0.0
+            },
+            'logs': {key: float(value) for key, value in (logs or {}).items()}
+        })
+
+    def on_train_end(self, logs=None):
+        if self._tracing:
+            self._stop_trace()
+        self.write(time.perf_counter() - self._train_start)
+
+    def _stop_trace(self):
+        tf.profiler.experimental.stop()
+        self._tracing = False
+
+    def write(self, seconds):
+        epochs = self.epochs
+        totals = {
+            'epochs': len(epochs),
+            'seconds': seconds,
+            'training_seconds': sum(e['training_seconds'] for e in epochs),
+            'validation_seconds': sum(e['validation_seconds'] for e in epochs),
+            'overhead_seconds': sum(e['overhead_seconds'] for e in epochs),
+            'samples_per_second': float(np.median([e['samples_per_second'] for e in epochs])) if epochs else 0.0,
+        }
+        report = {
+            'summary': totals,
+            'trace': {'start_step': self.trace_start, 'end_step': self.trace_end, 'directory': 'trace'} if self.trace_start is not None else None,
+            'epochs': epochs
+        }
+        with open(os.path.join(self.directory, 'profile.json'), 'w') as f:
+            json.dump(report, f, indent=4)
+        print("Training profile: {:.2f} seconds, {:.0f}% steps, {:.0f}% validation, {:.0f}% overhead, {:.0f} samples/sec".format(
+            seconds,
+            100 * totals['training_seconds'] / seconds if seconds else 0,
+            100 * totals['validation_seconds'] / seconds if seconds else 0,
+            100 * totals['overhead_seconds'] / seconds if seconds else 0,
+            totals['samples_per_second']))
@@ -0,0 +1,93 @@
+import os
+import numpy as np
+
+try:
+    # The interpreter may be called from the native inference threads, use a real OS lock
+    from gevent.monkey import get_original
+    allocate_lock = get_original('_thread', 'allocate_lock')
+except ImportError:
+    from _thread import allocate_lock
+
+# Reduced-precision variants exported next to `model.h5`
+VARIANTS = {
+    'float16': 'model-float16.tflite',
+    'int8': 'model-int8.tflite'
+}
+
+
+def export(keras_model, directory):
+    """
+    Description:
+    -----------
+    Converts the model to TensorFlow Lite with float16 weights and with int8 (dynamic range) weights.
+
+    Both variants keep float32 inputs and outputs, so they are drop-in replacements for serving.
+
+    :keras_model: (keras.Model) Trained model.
+    :directory: (str) Directory the `.tflite` files are written to.
+
+    :returns: (dict) Variant name to file path.
+    """
+    import tensorflow as tf
+    paths = {}
+    for variant, file_name in VARIANTS.items():
+        converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if variant == 'float16':
+            converter.target_spec.supported_types = [tf.float16]
+        paths[variant] = os.path.join(directory, file_name)
+        with open(paths[variant], 'wb') as f:
+            f.write(converter.convert())
+    return paths
+
+
+class TFLiteModel(object):
+    """
+    Description:
+    -----------
+    Serves a `.tflite` model on CPU with the same `predict()` interface as a Keras model.
+
+    Uses the standalone `tflite_runtime` package when it is installed, so TensorFlow isn't needed.
+    The input tensor is sized in powers of two and padded, so changing batch sizes only rarely
+    re-allocate the interpreter.
+
+    :path: (str) Path of the `.tflite` file.
+    """
+    def __init__(self, path):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        threads = int(os.environ.get('TF_NUM_INTRAOP_THREADS', 0)) or None
+        self.path = path
+        self._interpreter = Interpreter(model_path=path, num_threads=threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._capacity = int(self._input['shape'][0])
+        # The interpreter is not thread-safe
+        self._lock = allocate_lock()
+
+    @property
+    def input_shape(self):
+        # Same convention as `keras.Model.input_shape`
+        return (None, int(self._input['shape'][-1]))
+
+    @property
+    def nbytes(self):
+        return os.path.getsize(self.path)
+
+    def predict(self, input):
+        x = np.asarray(input, dtype=self._input['dtype'])
+        rows = x.shape[0]
+        with self._lock:
+            if rows > self._capacity or rows * 4 < self._capacity:
+                self._capacity = 1 << max(0, rows - 1).bit_length()
+                self._interpreter.resize_tensor_input(self._input['index'], [self._capacity, x.shape[1]])
+                self._interpreter.allocate_tensors()
+            if rows < self._capacity:
+                x = np.concatenate([x, np.zeros((self._capacity - rows, x.shape[1]), dtype=x.dtype)])
+            self._interpreter.set_tensor(self._input['index'], x)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output['index'])[:rows].copy()
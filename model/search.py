@@ -0,0 +1,175 @@
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import time
+import numpy as np
+import cpu_plan
+
+# Hyperparameters that accept a comma separated list of choices, e.g. "layers": "2,3,4"
+SEARCH_KEYS = ['layers', 'dense_layer', 'batch_size']
+
+
+def _init_worker(env):
+    # Runs before TensorFlow is imported, so the thread limits apply to the whole process
+    os.environ.update(env)
+
+
+def _train_rung(build_model, config, data_dir, checkpoint, initial_epoch, epochs):
+    # Trains one candidate from `initial_epoch` to `epochs` inside a pool process
+    import tensorflow as tf
+    from tensorflow import keras
+    threads = int(os.environ.get('TF_NUM_INTRAOP_THREADS', 1))
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    except RuntimeError:
+        # Already initialized by a previous rung of this process
+        pass
+    keras.backend.clear_session()
+
+    arrays = [np.load(os.path.join(data_dir, name + '.npy'), mmap_mode='r') for name in ['train_X', 'train_y', 'val_X', 'val_y']]
+    train_X, train_y, val_X, val_y = arrays
+    if initial_epoch > 0:
+        model = keras.models.load_model(checkpoint)
+    else:
+        model = build_model(config)
+        model.compile(loss='mse', optimizer='adam', metrics=['mae','accuracy'])
+    start = time.time()
+    history = model.fit(
+        x=train_X,
+        y=train_y,
+        validation_data=(val_X, val_y),
+        batch_size=config.get('batch_size'),
+        initial_epoch=initial_epoch,
+        epochs=epochs,
+        shuffle=True,
+        verbose=0,
+        callbacks=[keras.callbacks.EarlyStopping(monitor='val_loss', patience=10)]
+    )
+    # Keep the optimizer state, the next rung resumes from here
+    model.save(checkpoint, overwrite=True, include_optimizer=True, save_format='h5')
+    return min(history.history['val_loss']), len(history.history['val_loss']), time.time() - start
+
+
+def candidates(params):
+    """
+    Description:
+    -----------
+    Expands the hyperparameters into every combination of the listed choices.
+
+    :params: (dict) Hyperparameters, values of `SEARCH_KEYS` may be comma separated lists.
+
+    :returns: (list) Hyperparameters of every candidate, a single entry when nothing is searched.
+    """
+    choices = []
+    for key in SEARCH_KEYS:
+        value = params.get(key)
+        if isinstance(value, str) and ',' in value:
+            choices.append([(key, int(v)) for v in value.split(',') if v.strip()])
+        else:
+            choices.append([(key, value)])
+    return [dict(params, **dict(combination)) for combination in itertools.product(*choices)]
+
+
+def rungs(candidate_count, max_epochs, eta, min_epochs=None):
+    """
+    Description:
+    -----------
+    Epoch budgets of the successive halving rungs.
+
+    Every rung keeps the best `1/eta` of the candidates, so there are just enough rungs to narrow
+    the candidates down to one, the last rung training up to `max_epochs`.
+
+    :candidate_count: (int) Number of candidates.
+    :max_epochs: (int) Epochs of the last rung.
+    :eta: (int) Reduction factor between rungs.
+    :min_epochs: (int) Epochs of the first rung, derived if `None`.
+
+    :returns: (list) Cumulative epochs at the end of every rung.
+    """
+    if min_epochs is None:
+        count = int(math.ceil(math.log(candidate_count, eta) - 1e-9)) if candidate_count > 1 else 0
+        min_epochs = max(1, max_epochs // eta ** count)
+    budgets = []
+    epochs = max_epochs
+    while epochs >= max(1, min_epochs):
+        budgets.insert(0, epochs)
+        epochs //= eta
+    return budgets or [max_epochs]
+
+
+def search(build_model, params, arrays, work_dir, processes=None, eta=3, min_epochs=None):
+    """
+    Description:
+    -----------
+    Successive halving search over the candidates returned by `candidates()`.
+
+    Candidates of a rung train at the same time in a pool of processes. After every rung only the
+    best `1/eta` by validation loss keep training, resuming from their checkpoint. The CPUs are split
+    evenly between the processes.
+
+    :build_model: (callable) Picklable function building an uncompiled model from hyperparameters.
+    :params: (dict) Hyperparameters, `epochs` is the budget of the last rung.
+    :arrays: (tuple) train_X, train_y, val_X, val_y
+    :work_dir: (str) Directory for the shared arrays and candidate checkpoints.
+    :processes: (int) Number of training processes, one per CPU if `None`.
+    :eta: (int) Reduction factor between rungs.
+    :min_epochs: (int) Epochs of the first rung, derived if `None`.
+
+    :returns: (tuple) Checkpoint path of the best candidate and the leaderboard.
+    """
+    configs = candidates(params)
+    budgets = rungs(len(configs), int(params.get('epochs')), eta, min_epochs)
+    print("Searching {} candidates over rungs of {} epochs".format(len(configs), budgets))
+
+    # Candidates memory-map the same arrays instead of receiving a copy each
+    data_dir = os.path.join(work_dir, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    for name, array in zip(['train_X', 'train_y', 'val_X', 'val_y'], arrays):
+        np.save(os.path.join(data_dir, name + '.npy'), np.ascontiguousarray(array))
+
+    leaderboard = [{
+        'candidate': i,
+        'hyperparameters': {key: config.get(key) for key in SEARCH_KEYS},
+        'checkpoint': os.path.join(work_dir, 'candidate-{}.h5'.format(i)),
+        'epochs': 0,
+        'val_loss': None,
+        'rungs': [],
+        'seconds': 0.0
+    } for i, config in enumerate(configs)]
+
+    processes = min(processes or len(cpu_plan.available_cpus()), len(configs))
+    env = cpu_plan.environment(cpu_plan.plan(workers=processes))
+    alive = list(range(len(configs)))
+    # `spawn` gives every process a clean runtime, TensorFlow is not fork-safe
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes, initializer=_init_worker, initargs=(env,)) as pool:
+        previous = 0
+        for rung, epochs in enumerate(budgets):
+            results = [pool.apply_async(_train_rung, (build_model, configs[i], data_dir, leaderboard[i]['checkpoint'], previous, epochs)) for i in alive]
+            for i, result in zip(alive, results):
+                val_loss, trained, seconds = result.get()
+                entry = leaderboard[i]
+                entry['epochs'] = previous + trained
+                entry['val_loss'] = float(val_loss)
+                entry['rungs'].append({'rung': rung, 'epochs': entry['epochs'], 'val_loss': float(val_loss)})
+                entry['seconds'] += seconds
+            alive.sort(key=lambda i: leaderboard[i]['val_loss'])
+            print("Rung {} ({} epochs): best val_loss {:.6f} of {} candidates".format(rung, epochs, leaderboard[alive[0]]['val_loss'], len(alive)))
+            if rung < len(budgets) - 1:
+                alive = alive[:int(math.ceil(len(alive) / eta))]
+            previous = epochs
+
+    best = leaderboard[alive[0]]['checkpoint']
+    # Candidates stopped earlier rank after the ones that survived more rungs
+    leaderboard.sort(key=lambda entry: (-len(entry['rungs']), entry['val_loss']))
+    for rank, entry in enumerate(leaderboard):
+        entry['rank'] = rank + 1
+    return best, leaderboard
+
+
+def write_leaderboard(leaderboard, path):
+    with open(path, 'w') as f:
+        json.dump([{key: value for key, value in entry.items() if key != 'checkpoint'} for entry in leaderboard], f, indent=4)
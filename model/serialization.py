@@ -0,0 +1,122 @@
+import io
+import json
+import numpy as np
+
+# Number of `abalone` features, used to reshape raw buffers sent without a `columns` parameter
+DEFAULT_COLUMNS = 10
+
+
+# Decoders: request body (Bytes) and content type parameters to a 2D NumPy array, one row per observation
+def decode_csv(body, params):
+    # Each non-empty line of the body is one observation
+    rows = [row for row in body.decode('utf-8').splitlines() if row.strip()]
+    if len(rows) == 0:
+        raise ValueError("Empty request body.")
+    # Ragged rows could still reshape to a rectangle, with the features shifted between rows
+    columns = rows[0].count(',') + 1
+    for i, row in enumerate(rows):
+        if row.count(',') + 1 != columns:
+            raise ValueError("Row {} has {} features, expected {}.".format(i + 1, row.count(',') + 1, columns))
+    payload = np.fromstring(','.join(rows), sep=',') # Convert `str` to `Numpy`
+    if payload.size != len(rows) * columns:
+        raise ValueError("Every feature must be a number.")
+    return payload.reshape(len(rows), columns)
+
+def decode_jsonlines(body, params):
+    # Each line is either a JSON array of features or an object with a `features` array
+    rows = []
+    for line in body.decode('utf-8').splitlines():
+        if line.strip():
+            row = json.loads(line)
+            if isinstance(row, dict):
+                if 'features' not in row:
+                    raise ValueError("JSON objects must have a 'features' array.")
+                row = row['features']
+            rows.append(row)
+    if len(rows) == 0:
+        raise ValueError("Empty request body.")
+    try:
+        return np.array(rows, dtype=np.float64, ndmin=2)
+    except TypeError:
+        # e.g. objects or `null` in place of numbers
+        raise ValueError("Every feature must be a number.")
+
+def decode_npy(body, params):
+    data = np.atleast_2d(np.load(io.BytesIO(body), allow_pickle=False))
+    # String or structured arrays would only fail inside the model
+    if not np.issubdtype(data.dtype, np.number):
+        raise ValueError("Array dtype must be numeric, got {}.".format(data.dtype))
+    return data
+
+def _raw_decoder(dtype):
+    def decode_raw(body, params):
+        columns = int(params.get('columns', DEFAULT_COLUMNS))
+        if columns < 1:
+            raise ValueError("The 'columns' parameter must be at least 1.")
+        if len(body) == 0 or len(body) % (dtype.itemsize * columns) != 0:
+            raise ValueError("Body size must be a multiple of {} bytes ({} columns of {}).".format(
+                dtype.itemsize * columns, columns, dtype.name))
+        # Zero-copy view over the request body
+        return np.frombuffer(body, dtype=dtype).reshape(-1, columns)
+    return decode_raw
+
+
+# Encoders: 2D NumPy array of predictions to the response body
+def encode_csv(predictions):
+    predictions = predictions.reshape(predictions.shape[0], -1)
+    if predictions.shape[1] == 1:
+        return '\n'.join(map(repr, predictions.ravel().tolist())) + '\n'
+    return ''.join(','.join(map(repr, row)) + '\n' for row in predictions.tolist())
+
+def encode_jsonlines(predictions):
+    predictions = predictions.reshape(predictions.shape[0], -1)
+    if predictions.shape[1] == 1:
+        return ''.join(json.dumps(value) + '\n' for value in predictions.ravel().tolist())
+    return ''.join(json.dumps(row) + '\n' for row in predictions.tolist())
+
+def encode_npy(predictions):
+    out = io.BytesIO()
+    np.save(out, predictions, allow_pickle=False)
+    return out.getvalue()
+
+def _raw_encoder(dtype):
+    def encode_raw(predictions):
+        return np.ascontiguousarray(predictions, dtype=dtype).tobytes()
+    return encode_raw
+
+
+FLOAT32 = np.dtype('<f4')
+FLOAT64 = np.dtype('<f8')
+
+DECODERS = {
+    'text/csv': decode_csv,
+    'application/jsonlines': decode_jsonlines,
+    'application/x-npy': decode_npy,
+    'application/x-float32': _raw_decoder(FLOAT32),
+    'application/x-float64': _raw_decoder(FLOAT64)
+}
+
+ENCODERS = {
+    'text/csv': encode_csv,
+    'application/jsonlines': encode_jsonlines,
+    'application/x-npy': encode_npy,
+    'application/x-float32': _raw_encoder(FLOAT32),
+    'application/x-float64': _raw_encoder(FLOAT64)
+}
+
+
+def response_type(accept, content_type):
+    """
+    Description:
+    -----------
+    Chooses the response content type from the request `Accept` header.
+
+    :accept: (MIMEAccept) Parsed `Accept` header of the request.
+    :content_type: (str) Content type of the request body.
+
+    :returns: (str) Response content type, or `None` if no supported type is acceptable.
+    """
+    # Answer in the request format unless the client asks for something else
+    default = content_type if content_type in ENCODERS else 'text/csv'
+    candidates = [default] + [t for t in ENCODERS if t != default]
+    return accept.best_match(candidates, default=None if accept else default)
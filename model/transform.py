@@ -0,0 +1,91 @@
+import itertools
+import multiprocessing
+import os
+import time
+from collections import deque
+import serialization
+
+# Model of the current pool process, set by `_init_worker()`
+_model = None
+
+
+def _init_worker(load_model):
+    global _model
+    _model = load_model()
+
+
+def _score(chunk):
+    # Parses, scores and formats a chunk of CSV lines inside a pool process
+    data = serialization.decode_csv(chunk, {})
+    return data.shape[0], serialization.encode_csv(_model.predict(data))
+
+
+def _chunks(path, chunk_rows):
+    # Reads the file `chunk_rows` lines at a time, so memory doesn't depend on the file size
+    with open(path, 'rb') as f:
+        while True:
+            lines = list(itertools.islice(f, chunk_rows))
+            if not lines:
+                return
+            chunk = b''.join(lines)
+            if chunk.strip():
+                yield chunk
+
+
+def input_files(input_dir):
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(files):
+            if not name.startswith('.'):
+                yield os.path.join(root, name)
+
+
+def transform(input_dir, output_dir, load_model, processes, chunk_rows):
+    """
+    Description:
+    -----------
+    Scores every CSV file of `input_dir` and writes the predictions to `output_dir`.
+
+    Files are streamed in chunks of `chunk_rows` lines and scored in parallel by a pool of
+    `processes` processes, each with its own copy of the model. At most two chunks per process are
+    in flight, so memory stays bounded whatever the size of the input. Predictions are written in
+    input order, one line per row, to `<output_dir>/<relative path>.out`.
+
+    :input_dir: (str) Directory of CSV files, one observation per line.
+    :output_dir: (str) Directory the predictions are written to.
+    :load_model: (callable) Picklable function returning a model with a `predict()` method.
+    :processes: (int) Number of scoring processes.
+    :chunk_rows: (int) Number of rows scored in one vectorized call.
+
+    :returns: (int) Total number of rows scored.
+    """
+    start = time.time()
+    total_rows = 0
+    # `spawn` gives every process a clean runtime, TensorFlow is not fork-safe
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes, initializer=_init_worker, initargs=(load_model,)) as pool:
+        for path in input_files(input_dir):
+            file_start = time.time()
+            file_rows = 0
+            output_file = os.path.join(output_dir, os.path.relpath(path, input_dir) + '.out')
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            with open(output_file, 'w') as out:
+                pending = deque()
+                for chunk in _chunks(path, chunk_rows):
+                    pending.append(pool.apply_async(_score, (chunk,)))
+                    if len(pending) >= 2 * processes:
+                        rows, result = pending.popleft().get()
+                        out.write(result)
+                        file_rows += rows
+                while pending:
+                    rows, result = pending.popleft().get()
+                    out.write(result)
+                    file_rows += rows
+            elapsed = time.time() - file_start
+            print("Transformed {}: {} rows in {:.2f} seconds ({:.0f} rows/sec).".format(
+                path, file_rows, elapsed, file_rows / elapsed if elapsed > 0 else 0))
+            total_rows += file_rows
+    elapsed = time.time() - start
+    print("Transform completed: {} rows in {:.2f} seconds ({:.0f} rows/sec).".format(
+        total_rows, elapsed, total_rows / elapsed if elapsed > 0 else 0))
+    return total_rows
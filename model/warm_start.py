@@ -0,0 +1,162 @@
+import json
+import os
+import tarfile
+import time
+import numpy as np
+from tensorflow import keras
+
+# Hashes of the rows a model was trained on, shipped next to `model.h5`
+row_hashes_file = 'training_rows.npy'
+
+_FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+_FNV_PRIME = np.uint64(0x100000001b3)
+
+
+def row_hashes(X, y):
+    """
+    Description:
+    -----------
+    64-bit hash of every (label, features) row, vectorized over the columns (FNV-1a over the
+    float64 bit patterns), so a row that changes in any column gets a different hash.
+
+    :X: (NumPy Array) Features, one row per observation.
+    :y: (NumPy Array) Labels.
+
+    :returns: (NumPy Array) uint64 hash of every row.
+    """
+    rows = np.column_stack([np.asarray(y, dtype=np.float64), np.asarray(X, dtype=np.float64)])
+    bits = np.ascontiguousarray(rows).view(np.uint64)
+    hashes = np.full(bits.shape[0], _FNV_OFFSET, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for column in range(bits.shape[1]):
+            hashes ^= bits[:, column]
+            hashes *= _FNV_PRIME
+    return hashes
+
+
+def write_row_hashes(X, y, directory):
+    np.save(os.path.join(directory, row_hashes_file), np.unique(row_hashes(X, y)))
+
+
+def find_model(channel_path, work_dir):
+    """
+    Description:
+    -----------
+    Locates the previous model in the optional 'model' channel.
+
+    The channel holds either the `model.tar.gz` of the previous training job, which is extracted
+    to `work_dir`, or its extracted content.
+
+    :channel_path: (str) Directory of the 'model' channel.
+    :work_dir: (str) Directory the archive is extracted to.
+
+    :returns: (str) Directory holding `model.h5`, `None` if the channel isn't provided.
+    """
+    if not os.path.isdir(channel_path):
+        return None
+    if os.path.isfile(os.path.join(channel_path, 'model.h5')):
+        return channel_path
+    archive = os.path.join(channel_path, 'model.tar.gz')
+    if os.path.isfile(archive):
+        with tarfile.open(archive) as tar_file:
+            tar_file.extractall(work_dir)
+        if os.path.isfile(os.path.join(work_dir, 'model.h5')):
+            return work_dir
+    raise ValueError("The 'model' channel must contain 'model.h5' or 'model.tar.gz' with 'model.h5'")
+
+
+def new_rows(X, y, directory):
+    """
+    Description:
+    -----------
+    Selects the rows the previous model wasn't trained on.
+
+    :X: (NumPy Array) Features.
+    :y: (NumPy Array) Labels.
+    :directory: (str) Directory of the previous model.
+
+    :returns: (NumPy Array) Boolean mask of the new or changed rows, all `True` if the previous model
+              has no row hashes.
+    """
+    path = os.path.join(directory, row_hashes_file)
+    if not os.path.isfile(path):
+        print("No {} with the previous model, fine-tuning on every row".format(row_hashes_file))
+        return np.ones(len(y), dtype=bool)
+    return ~np.isin(row_hashes(X, y), np.load(path))
+
+
+def train(directory, build_model, params, arrays, model_path):
+    """
+    Description:
+    -----------
+    Fine-tunes the previous model on the new rows only.
+
+    Writes `warm_start.json` with the validation MSE of the previous model, of the fine-tuned model,
+    and, when the `warm_start_baseline` hyperparameter is 'on', of a model trained from scratch on
+    every row with the usual `epochs`, to confirm the warm start converges as well.
+
+    :directory: (str) Directory of the previous model.
+    :build_model: (callable) Function building an uncompiled model from hyperparameters.
+    :params: (dict) Hyperparameters, `warm_start_epochs` and `warm_start_learning_rate` are used.
+    :arrays: (tuple) train_X, train_y, val_X, val_y
+    :model_path: (str) Directory the report is written to.
+
+    :returns: (keras.Model) Fine-tuned model.
+    """
+    train_X, train_y, val_X, val_y = arrays
+    model = keras.models.load_model(os.path.join(directory, 'model.h5'), compile=False)
+    if model.input_shape[-1] != train_X.shape[1]:
+        raise ValueError("The previous model expects {} features, the data has {}".format(model.input_shape[-1], train_X.shape[1]))
+    learning_rate = float(params.get('warm_start_learning_rate', 0.0001))
+    model.compile(loss='mse', optimizer=keras.optimizers.Adam(learning_rate=learning_rate), metrics=['mae','accuracy'])
+    previous_mse = model.evaluate(val_X, val_y, verbose=0)[0]
+
+    mask = new_rows(train_X, train_y, directory)
+    epochs = int(params.get('warm_start_epochs', 50))
+    print("Warm start: fine-tuning on {} new rows of {} for up to {} epochs".format(int(mask.sum()), len(mask), epochs))
+    start = time.time()
+    trained_epochs = 0
+    if mask.any():
+        history = model.fit(
+            x=train_X[mask],
+            y=train_y[mask],
+            validation_data=(val_X, val_y),
+            batch_size=params.get('batch_size'),
+            epochs=epochs,
+            shuffle=True,
+            verbose=1,
+            callbacks=[keras.callbacks.EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True)]
+        )
+        trained_epochs = len(history.history['loss'])
+    report = {
+        'previous_val_mse': float(previous_mse),
+        'warm_start_val_mse': float(model.evaluate(val_X, val_y, verbose=0)[0]),
+        'warm_start_seconds': time.time() - start,
+        'warm_start_epochs': trained_epochs,
+        'new_rows': int(mask.sum()),
+        'total_rows': len(mask)
+    }
+
+    if params.get('warm_start_baseline', 'off') == 'on':
+        print("Warm start: training the full retrain baseline")
+        start = time.time()
+        baseline = build_model(params)
+        baseline.compile(loss='mse', optimizer='adam', metrics=['mae','accuracy'])
+        history = baseline.fit(
+            x=train_X,
+            y=train_y,
+            validation_data=(val_X, val_y),
+            batch_size=params.get('batch_size'),
+            epochs=params.get('epochs'),
+            shuffle=True,
+            verbose=0,
+            callbacks=[keras.callbacks.EarlyStopping(monitor='val_loss', patience=10)]
+        )
+        report['baseline_val_mse'] = float(baseline.evaluate(val_X, val_y, verbose=0)[0])
+        report['baseline_seconds'] = time.time() - start
+        report['baseline_epochs'] = len(history.history['loss'])
+
+    print("Warm start: {}".format(report))
+    with open(os.path.join(model_path, 'warm_start.json'), 'w') as f:
+        json.dump(report, f, indent=4)
+    return model
@@ -3,4 +3,10 @@
 # new file.
 
 import app as myapp
-app = myapp.app
\ No newline at end of file
+
+if myapp.model_server_preload:
+    # With `--preload` this runs once in the gunicorn master, before the workers are forked;
+    # the workers start their own model watcher in `gunicorn_conf.post_fork()`
+    myapp.PredictionService.get_model(watch=False)
+
+app = myapp.app
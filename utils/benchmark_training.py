@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+# Training code of the container
+code_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model')
+# Bundled sample of the ETL output
+data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'unit_test', 'input', 'data', 'training')
+
+
+def benchmark(name, params, arrays, epochs):
+    """
+    Description:
+    ------------
+    Trains a model with `params` and measures the training throughput.
+
+    The first epoch includes tracing and XLA compilation, so it is reported separately and the
+    throughput is measured over the following epochs.
+
+    :name: (str) Name of the configuration.
+    :params: (dict) Hyperparameters.
+    :arrays: (tuple) train_X, train_y, val_X, val_y
+    :epochs: (int) Number of epochs, at least 2.
+
+    :returns: (dict) Benchmark results.
+    """
+    import tensorflow as tf
+    import model as training
+    import performance
+
+    train_X, train_y, val_X, val_y = arrays
+    tf.keras.backend.clear_session()
+    tf.random.set_seed(0)
+    model = training.build_model(params)
+    callbacks = performance.compile_model(model, params, (val_X, val_y))
+
+    epoch_times = []
+
+    class Timer(tf.keras.callbacks.Callback):
+        def on_epoch_begin(self, epoch, logs=None):
+            self.start = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            epoch_times.append(time.perf_counter() - self.start)
+
+    history = model.fit(
+        x=train_X,
+        y=train_y,
+        validation_data=(val_X, val_y),
+        batch_size=params['batch_size'],
+        epochs=epochs,
+        shuffle=True,
+        verbose=0,
+        callbacks=callbacks + [Timer()]
+    )
+    steps = -(-len(train_X) // params['batch_size'])
+    steady = sum(epoch_times[1:])
+    return {
+        'name': name,
+        'batch_size': params['batch_size'],
+        'first_epoch_seconds': epoch_times[0],
+        'steps_per_second': steps * (len(epoch_times) - 1) / steady,
+        'samples_per_second': len(train_X) * (len(epoch_times) - 1) / steady,
+        'val_loss': float(history.history['val_loss'][-1])
+    }
+
+
+def main(epochs, output):
+    sys.path.insert(0, code_dir)
+    import model as training
+
+    arrays = training.load_arrays(data_dir)
+    base = {'layers': 2, 'dense_layer': 64, 'batch_size': 8}
+    fast = dict(base, performance_mode='on', step_metrics='none', epoch_metrics='mae')
+    configurations = [
+        ('baseline', base),
+        ('xla', fast),
+        ('xla-steps-8', dict(fast, steps_per_execution=8)),
+        ('xla-batch-64-sqrt', dict(fast, batch_size=64, base_batch_size=8, lr_scaling='sqrt', steps_per_execution=8)),
+        ('xla-batch-64-linear', dict(fast, batch_size=64, base_batch_size=8, lr_scaling='linear', steps_per_execution=8))
+    ]
+    results = []
+    for name, params in configurations:
+        result = benchmark(name, params, arrays, epochs)
+        results.append(result)
+        print("{:<22} batch {:>3}: {:>9.1f} steps/sec {:>10.0f} samples/sec, first epoch {:.2f} sec, val_loss {:.4f}".format(
+            name, result['batch_size'], result['steps_per_second'], result['samples_per_second'],
+            result['first_epoch_seconds'], result['val_loss']))
+    baseline = results[0]['samples_per_second']
+    for result in results:
+        result['speedup'] = result['samples_per_second'] / baseline
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the training throughput of the baseline and performance modes")
+    parser.add_argument('--epochs', type=int, default=10, help="Epochs per configuration, the first one is a warm-up")
+    parser.add_argument('--output', help="Optional JSON file for the results")
+    args = parser.parse_args()
+    main(max(2, args.epochs), args.output)
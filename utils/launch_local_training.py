@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+
+def free_ports(count):
+    """
+    Description:
+    ------------
+    Reserves `count` free TCP ports on localhost.
+
+    :count: (int) Number of ports.
+
+    :returns: (list) Port numbers.
+    """
+    sockets = []
+    for _ in range(count):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind(('localhost', 0))
+        sockets.append(s)
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+    return ports
+
+
+def launch(workers, code_dir):
+    """
+    Description:
+    ------------
+    Runs `app.py train` as a cluster of `workers` processes on localhost.
+
+    Every process gets the `TF_CONFIG` of one worker, the same way each Sagemaker training
+    instance derives it from `resourceconfig.json`. The training data, hyperparameters and
+    model output are the usual `/opt/ml` paths, e.g. run inside the training container with
+    `tests/unit_test/input` mounted on `/opt/ml/input`.
+
+    :workers: (int) Number of worker processes.
+    :code_dir: (str) Directory of `app.py`.
+
+    :returns: (int) Exit code, non-zero if any worker failed.
+    """
+    cluster = {'worker': ['localhost:{}'.format(port) for port in free_ports(workers)]}
+    start = time.time()
+    processes = []
+    for index in range(workers):
+        env = dict(os.environ, TF_CONFIG=json.dumps({'cluster': cluster, 'task': {'type': 'worker', 'index': index}}))
+        processes.append(subprocess.Popen([sys.executable, 'app.py', 'train'], cwd=code_dir, env=env))
+    exit_code = 0
+    for index, process in enumerate(processes):
+        returncode = process.wait()
+        print("Worker {} exited with code {}".format(index + 1, returncode))
+        exit_code = exit_code or returncode
+    print("Training with {} workers completed in {:.2f} seconds".format(workers, time.time() - start))
+    return exit_code
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local multi-worker training on localhost")
+    parser.add_argument('--workers', type=int, default=2, help="Number of worker processes")
+    # Inside the training container the code is in `/opt/ml/code`, otherwise use the repository
+    code_dir = '/opt/ml/code' if os.path.isdir('/opt/ml/code') else os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'model')
+    parser.add_argument('--code-dir', default=code_dir, help="Directory of `app.py`")
+    args = parser.parse_args()
+    sys.exit(launch(args.workers, args.code_dir))